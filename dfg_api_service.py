@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP/JSON service for the DFG functions (discovery, footprint, filtering, rendering)
+
+Requests are handled by asyncio, the discovery and Graphviz rendering run in a pool of processes.
+Identical requests arriving at the same time are computed once and the result is sent to all of them.
+All endpoints take POST with a JSON body containing the event log string in the app format:
+    POST /dfg        {"log": "[<acd>45, <bce>42]"}                      - DFG nodes & arcs
+    POST /footprint  {"log": ...}                                       - DFG matrix & footprint
+    POST /filter     {"log": ..., "filters": [["act", 30], ["arc", 5]], "metric": "qty"} - filtered DFG (see get_filter_pipeline)
+    POST /render     {"log": ..., "orientation": "LR", "format": "png", "metric": "qty", "filters": [...]} - DFG image
+    POST /batch      {"requests": [{"endpoint": "dfg", "log": ...}, ...]} - several requests, NDJSON
+    GET  /health
+With "stream": true the tables of /dfg and /filter are written as NDJSON lines to a temporary
+file by the worker and sent from the file in chunks (chunked transfer encoding), so large results
+are not built as one JSON document. The event loop does not parse the request bodies: identical
+requests are found by a hash of the raw body, the JSON is decoded in the worker processes.
+
+Example
+-------
+python dfg_api_service.py --port 8600 --workers 4
+curl -X POST localhost:8600/dfg -d '{"log": "[<acd>45, <bce>42]"}'
+"""
+# packages
+import argparse
+import asyncio
+import concurrent.futures
+import functools
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+import directly_follows_graph as dfg
+
+endpoints = ['dfg', 'footprint', 'filter', 'render']
+stream_chunk_bytes = 2**16
+http_status = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+               500: 'Internal Server Error'}
+
+# =============================================================================
+# Computation (runs in the worker processes)
+# =============================================================================
+@functools.lru_cache(maxsize = 32)
+def get_log(str_log):
+    '''
+    Variants (with start & end) and DFG of the event log, kept in the worker for the next requests with the same log
+    '''
+    df_log = dfg.get_df_log(str_log)
+    if len(df_log) == 0: raise ValueError('Error! Check your input data')
+    traces_list, qty_list = dfg.get_variants(list('I' + df_log['trace'] + 'O'), list(df_log['qty']))
+    return (traces_list, qty_list), dfg.get_DFG(traces_list, qty_list)
+
+def get_filtered_DFG(request, metric = 'qty'):
+    '''
+    DFG of the request log after the request filters (all filters are optional), τ(arc) is compared with the metric
+    '''
+    (traces_list, qty_list), DFG = get_log(request['log'])
+    filters = [(kind, int(tau)) for kind, tau in request.get('filters', [])]
+    return dfg.get_filter_pipeline(traces_list, qty_list, filters, DFG, metric)
+
+def save_json_lines(DFG_nodes, DFG_arcs, plan):
+    '''
+    DFG as NDJSON lines {"node": ...}, {"arc": ...} and {"plan": ...} written row by row to a temporary file
+
+    Returns
+    -------
+    path : str
+        the file, it is removed by the service after sending
+    '''
+    with tempfile.NamedTemporaryFile('w', encoding = 'utf-8', suffix = '.ndjson', delete = False) as f:
+        for name, df in (('node', DFG_nodes), ('arc', DFG_arcs)):
+            for row in df.itertuples(index = False):
+                f.write(json.dumps({name: {col: (x.item() if hasattr(x, 'item') else x) for col, x in zip(df.columns, row)}},
+                                   ensure_ascii = False) + '\n')
+        f.write(json.dumps({'plan': plan}, ensure_ascii = False) + '\n')
+    return f.name
+
+def get_batch_items(body):
+    '''
+    Sub-requests of the /batch request: list of (endpoint, request body) with the bodies as canonical JSON
+    '''
+    items = []
+    for item in json.loads(body)['requests']:
+        item = dict(item)
+        endpoint = item.pop('endpoint', 'dfg')
+        if endpoint not in endpoints or endpoint == 'render': raise ValueError('Unknown batch endpoint %s' % (endpoint))
+        item.pop('stream', None)
+        items.append((endpoint, json.dumps(item, sort_keys = True).encode('utf-8')))
+    return items
+
+def run_request(endpoint, body):
+    '''
+    Computing the response of one request (body - the raw JSON of the request)
+
+    Returns
+    -------
+    content_type : str
+    chunks : list or str
+        response body as a list of bytes, or the path of the temporary file with a streamed body
+    '''
+    request = json.loads(body)
+    if endpoint == 'footprint':
+        DFG_arcs = get_log(request['log'])[1][1]
+        df_footprint, dict_footprint, df_dfg_matrix, dict_dfg_matrix = \
+            dfg.get_footprint_matrix(list(DFG_arcs['pair']), list(DFG_arcs['qty']), 'I', 'O')
+        result = {'act': list(df_footprint.index), 'matrix': df_dfg_matrix.values.tolist(),
+                  'footprint': df_footprint.values.tolist()}
+        return 'application/json', [json.dumps(result, ensure_ascii = False).encode('utf-8')]
+    metric = request.get('metric', 'qty')   # arc labels and τ(arc)
+    if metric not in dfg.arc_metrics: raise ValueError('Unknown metric %s (expected one of %s)' % (metric, ', '.join(dfg.arc_metrics)))
+    DFG_nodes, DFG_arcs, plan = get_filtered_DFG(request, metric)
+    if endpoint == 'render':
+        fmt = request.get('format', 'png')
+        if fmt not in ('png', 'svg'): raise ValueError('Unknown format %s (expected png or svg)' % (fmt))
+        image = dfg.get_vDFG(DFG_arcs, DFG_nodes, request.get('orientation', 'LR'), 'I', 'O', fmt, metric)
+        return ('image/png' if fmt == 'png' else 'image/svg+xml'), [image]
+    if request.get('stream', False): return 'application/x-ndjson', save_json_lines(DFG_nodes, DFG_arcs, plan)
+    result = {'nodes': DFG_nodes.to_dict('records'), 'arcs': DFG_arcs.to_dict('records'), 'plan': plan}
+    return 'application/json', [json.dumps(result, ensure_ascii = False).encode('utf-8')]
+
+# =============================================================================
+# Request handling (event loop)
+# =============================================================================
+def release_file(entry):
+    '''
+    Removing the temporary file of a finished streamed response when no request waits for it
+    '''
+    future = entry['future']
+    if (entry['waiters'] > 0) or (not future.done()) or future.cancelled() or (future.exception() is not None): return
+    path = future.result()[1]
+    if isinstance(path, str) and os.path.exists(path): os.remove(path)
+
+async def get_response(service, endpoint, body):
+    '''
+    Response of one request: identical requests in progress (the same hash of the raw body)
+    share one computation. A streamed body is returned as an open file (see read_file_chunks),
+    its temporary file is removed when the last request sharing it has opened it.
+    '''
+    loop = asyncio.get_running_loop()
+    digest = await loop.run_in_executor(None, lambda: hashlib.sha256(body).hexdigest())   # large bodies off the loop
+    key = (endpoint, digest)
+    entry = service['in_flight'].get(key)
+    if entry is None:
+        entry = service['in_flight'][key] = {'future': loop.run_in_executor(service['pool'], run_request, endpoint, body), 'waiters': 0}
+        entry['future'].add_done_callback(lambda _: service['in_flight'].pop(key, None))
+        entry['future'].add_done_callback(lambda _: release_file(entry))   # all requests have gone
+    else: service['coalesced'] += 1
+    entry['waiters'] += 1
+    try:
+        content_type, chunks = await asyncio.shield(entry['future'])
+        if isinstance(chunks, str): return content_type, open(chunks, 'rb')
+        return content_type, chunks
+    finally:
+        entry['waiters'] -= 1
+        release_file(entry)
+
+async def read_file_chunks(f):
+    '''
+    Chunks of stream_chunk_bytes of the open file (read in a thread), the file is closed at the end
+    '''
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            chunk = await loop.run_in_executor(None, f.read, stream_chunk_bytes)
+            if not chunk: break
+            yield chunk
+    finally: f.close()
+
+async def write_response(writer, status, content_type, chunks, chunked = False):
+    '''
+    Writing the HTTP response; chunked - with the chunked transfer encoding (one chunk per item).
+    chunks - list of bytes or an open file (sent chunked by read_file_chunks)
+    '''
+    head = ['HTTP/1.1 %d %s' % (status, http_status[status]), 'Content-Type: ' + content_type]
+    if chunked: head.append('Transfer-Encoding: chunked')
+    else: head.append('Content-Length: %d' % (sum(len(chunk) for chunk in chunks)))
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+    async def get_chunks():
+        if isinstance(chunks, list):
+            for chunk in chunks: yield chunk
+        else:
+            async for chunk in read_file_chunks(chunks): yield chunk
+    async for chunk in get_chunks():
+        if chunked: writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+        else: writer.write(chunk)
+        await writer.drain()
+    if chunked: writer.write(b'0\r\n\r\n')
+    await writer.drain()
+
+def get_error(status, message):
+    return status, 'application/json', [json.dumps({'error': message}, ensure_ascii = False).encode('utf-8')], False
+
+async def route(service, method, path, body):
+    '''
+    Response of the HTTP request: (status, content type, chunks, chunked)
+    '''
+    path = path.split('?')[0].strip('/')
+    if path == 'health':
+        return 200, 'application/json', [json.dumps({'status': 'ok', 'coalesced': service['coalesced']}).encode()], False
+    if path not in endpoints + ['batch']: return get_error(404, 'Unknown endpoint /%s' % (path))
+    if method != 'POST': return get_error(405, 'Use POST for /%s' % (path))
+    try:
+        if path != 'batch':
+            content_type, chunks = await get_response(service, path, body)
+            return 200, content_type, chunks, not isinstance(chunks, list)
+        # batch: the body is split in a worker, the sub-requests run at the same time,
+        # the results are sent as NDJSON lines in their order
+        items = await asyncio.get_running_loop().run_in_executor(service['pool'], get_batch_items, body)
+        async def get_item(i, endpoint, item_body):
+            content_type, chunks = await get_response(service, endpoint, item_body)
+            return b'{"index": %d, "result": %s}\n' % (i, b''.join(chunks))
+        items = await asyncio.gather(*[get_item(i, endpoint, item_body) for i, (endpoint, item_body) in enumerate(items)])
+        return 200, 'application/x-ndjson', items, True
+    except (ValueError, KeyError, TypeError) as ex_msg: return get_error(400, str(ex_msg))
+    except Exception as ex_msg: return get_error(500, str(ex_msg))
+
+async def handle_connection(service, reader, writer):
+    '''
+    HTTP/1.1 connection (keep-alive): request line, headers and body with Content-Length
+    '''
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip(): break
+            method, path = request_line.decode('latin-1').split()[:2]
+            headers = dict()
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''): break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', '0'))
+            if length > service['max_body']:
+                await write_response(writer, *get_error(413, 'Request body is larger than %d bytes' % (service['max_body'])))
+                break
+            body = await reader.readexactly(length) if length > 0 else b''
+            await write_response(writer, *(await route(service, method, path, body)))
+            if headers.get('connection', '').lower() == 'close': break
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError): pass
+    finally:
+        writer.close()
+
+async def run_service(host, port, workers, max_body):
+    service = {'pool': concurrent.futures.ProcessPoolExecutor(max_workers = workers),
+               'in_flight': dict(), 'coalesced': 0, 'max_body': max_body}
+    server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), host, port)
+    print('DFG service on http://%s:%d (%d workers)' % (host, port, workers or os.cpu_count()))
+    try:
+        async with server: await server.serve_forever()
+    finally: service['pool'].shutdown(cancel_futures = True)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'HTTP/JSON service for DFG discovery, footprint, filtering and rendering')
+    parser.add_argument('--host', default = '127.0.0.1', help = 'host (default: 127.0.0.1)')
+    parser.add_argument('--port', type = int, default = 8600, help = 'port (default: 8600)')
+    parser.add_argument('--workers', type = int, default = os.cpu_count(), help = 'computation processes (default: number of cores)')
+    parser.add_argument('--max-body-mb', type = int, default = 64, help = 'largest request body, MB (default: 64)')
+    args = parser.parse_args(argv)
+    try: asyncio.run(run_service(args.host, args.port, args.workers, args.max_body_mb * 2**20))
+    except KeyboardInterrupt: pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Batch export of DFG images, tables, matrices and footprints for many event logs
+
+Every input file contains one event log as a string in the app format ('[<acd>45, <bce>42]').
+For each log <name> the following files are written to the output folder (see save_DFG_export):
+    <name>_LR.png / <name>_LR.svg  - DFG image(s) with the orientation in the name
+    <name>_nodes.parquet           - DFG nodes with their metrics
+    <name>_arcs.parquet            - DFG arcs with their metrics
+    <name>_matrix.npz              - DFG matrix, compressed sparse (see save_matrix_npz)
+    <name>_footprint.parquet       - DFG footprint, long format (see save_footprint_parquet)
+With --table-format arrow the tables are written as Arrow IPC files (.arrow) instead of Parquet.
+Outputs newer than both the log and the code are skipped (use --force to rebuild them).
+Every file is written to a temporary file first and renamed when it is complete, so an
+interrupted run does not leave partial files that look up to date.
+With --memory the discovery processes trace the Python allocations (tracemalloc, slower) and
+the peak memory of every stage (parsing, discovery, export) is reported - the highest over all logs.
+
+Example
+-------
+python dfg_batch_export.py logs/*.txt --out export --formats png,svg --orientation LR
+"""
+# packages
+import argparse
+import concurrent.futures
+import contextlib
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+import directly_follows_graph as dfg
+
+def get_log_paths(inputs):
+    '''
+    Input files and folders (all *.txt files of a folder) as a sorted list of files
+    '''
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item): paths.extend(glob.glob(os.path.join(item, '*.txt')))
+        else: paths.extend(glob.glob(item))
+    return sorted(set(paths))
+
+def get_output_paths(path, out_dir, formats, orientation = 'LR', table_fmt = 'parquet'):
+    '''
+    Output files of one log: {'png': ..., 'svg': ..., 'nodes': ..., 'arcs': ..., 'matrix': ..., 'footprint': ...}
+    '''
+    name = os.path.splitext(os.path.basename(path))[0]
+    outputs = {fmt: os.path.join(out_dir, name + '_' + orientation + '.' + fmt) for fmt in formats}
+    outputs.update(dfg.get_export_paths(out_dir, name, table_fmt))
+    return outputs
+
+def is_up_to_date(path, outputs):
+    '''
+    True if all outputs exist and are newer than the log and the code of the DFG module
+    '''
+    source_mtime = max(os.path.getmtime(path), os.path.getmtime(dfg.__file__))
+    return all(os.path.exists(out) and os.path.getmtime(out) >= source_mtime for out in outputs.values())
+
+def save_atomic(paths, save):
+    '''
+    Writing the files {key: path} by save({key: binary file}): the data goes to temporary files
+    that are renamed to the paths only after all of them are written
+    '''
+    files = {key: open(path + '.tmp', 'wb') for key, path in paths.items()}
+    try: save(files)
+    except BaseException:
+        for key, f in files.items():
+            f.close()
+            os.remove(paths[key] + '.tmp')
+        raise
+    for key, f in files.items():
+        f.close()
+        os.replace(paths[key] + '.tmp', paths[key])
+
+@contextlib.contextmanager
+def track_memory(memory_report, stage):
+    '''
+    Peak memory (bytes) allocated by Python during the stage - memory_report[stage].
+    Measured only if tracemalloc is tracing (see start_tracing), otherwise nothing is done.
+    '''
+    if not tracemalloc.is_tracing():
+        yield
+        return
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    try: yield
+    finally: memory_report[stage] = tracemalloc.get_traced_memory()[1] - base
+
+def start_tracing():
+    '''
+    Initializer of the discovery processes with --memory: tracing of the allocations (see track_memory)
+    '''
+    tracemalloc.start()
+
+def discover(path, outputs, table_fmt = 'parquet'):
+    '''
+    Discovery of one log (runs in the process pool): the DFG is computed and
+    the tables, matrix & footprint are written. The DFG is returned for rendering
+    with the peak memory of the stages (see track_memory).
+    '''
+    memory_report = dict()
+    with track_memory(memory_report, 'parsing'):
+        with open(path, encoding = 'utf-8') as f: df_log = dfg.get_df_log(f.read())
+        if len(df_log) == 0: raise ValueError('no traces found in %s' % (path))
+    with track_memory(memory_report, 'discovery'):
+        DFG_nodes, DFG_arcs = dfg.get_DFG(list('I' + df_log['trace'] + 'O'), list(df_log['qty']))
+    paths = {key: outputs[key] for key in ['nodes', 'arcs', 'matrix', 'footprint']}
+    with track_memory(memory_report, 'export'):
+        save_atomic(paths, lambda files: dfg.save_DFG_export(files, DFG_nodes, DFG_arcs, 'I', 'O', table_fmt))
+    return DFG_nodes, DFG_arcs, int(df_log['qty'].sum()), memory_report
+
+def render(DFG_nodes, DFG_arcs, orientation, fmt, out_path):
+    '''
+    Rendering of one DFG image (runs in the thread pool, each call starts one `dot` process)
+    '''
+    image = dfg.get_vDFG(DFG_arcs, DFG_nodes, orientation, 'I', 'O', fmt)
+    save_atomic({'image': out_path}, lambda files: files['image'].write(image))
+
+def run_export(paths, out_dir, formats, orientation, workers, render_workers, force, table_fmt = 'parquet', memory = False):
+    '''
+    Export of all logs: discovery in a pool of processes, rendering in a bounded pool of
+    Graphviz workers. Rendering of a log starts as soon as its discovery is finished.
+    memory - the discovery processes trace the allocations (see track_memory).
+
+    Returns
+    -------
+    report : dict
+        'logs', 'skipped', 'failed', 'cases', 'images', 'seconds',
+        'memory' - the highest peak memory of every discovery stage over all logs in bytes (with memory = True)
+    '''
+    os.makedirs(out_dir, exist_ok = True)
+    report = {'logs': 0, 'skipped': 0, 'failed': [], 'cases': 0, 'images': 0, 'memory': dict()}
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers = workers, initializer = start_tracing if memory else None) as discovery_pool, \
+         concurrent.futures.ThreadPoolExecutor(max_workers = render_workers) as render_pool:
+        discovery_jobs, render_jobs = dict(), dict()
+        for path in paths:
+            outputs = get_output_paths(path, out_dir, formats, orientation, table_fmt)
+            if (not force) and is_up_to_date(path, outputs):
+                report['skipped'] += 1
+                continue
+            discovery_jobs[discovery_pool.submit(discover, path, outputs, table_fmt)] = (path, outputs)
+        for job in concurrent.futures.as_completed(discovery_jobs):
+            path, outputs = discovery_jobs[job]
+            try: DFG_nodes, DFG_arcs, cases, memory_report = job.result()
+            except Exception as ex_msg:
+                report['failed'].append((path, str(ex_msg)))
+                continue
+            report['logs'] += 1
+            report['cases'] += cases
+            for stage, qty in memory_report.items(): report['memory'][stage] = max(report['memory'].get(stage, 0), qty)
+            for fmt in formats:
+                render_jobs[render_pool.submit(render, DFG_nodes, DFG_arcs, orientation, fmt, outputs[fmt])] = path
+        for job in concurrent.futures.as_completed(render_jobs):
+            try:
+                job.result()
+                report['images'] += 1
+            except Exception as ex_msg: report['failed'].append((render_jobs[job], str(ex_msg)))
+    report['seconds'] = time.perf_counter() - start
+    return report
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Batch export of DFG images, tables, matrices and footprints')
+    parser.add_argument('inputs', nargs = '+', help = 'event log files (one log string per file) or folders with *.txt files')
+    parser.add_argument('--out', default = 'dfg_export', help = 'output folder (default: dfg_export)')
+    parser.add_argument('--formats', default = 'png', help = 'image formats, comma separated: png,svg (default: png)')
+    parser.add_argument('--table-format', default = 'parquet', choices = list(dfg.export_formats), help = 'format of the tables (default: parquet)')
+    parser.add_argument('--orientation', default = 'LR', choices = ['LR','TB'], help = 'DFG orientation (default: LR)')
+    parser.add_argument('--workers', type = int, default = os.cpu_count(), help = 'discovery processes (default: number of cores)')
+    parser.add_argument('--render-workers', type = int, default = os.cpu_count(), help = 'parallel Graphviz processes (default: number of cores)')
+    parser.add_argument('--force', action = 'store_true', help = 'rebuild outputs that are up to date')
+    parser.add_argument('--memory', action = 'store_true', help = 'report the peak memory of the discovery stages (tracemalloc, slower)')
+    args = parser.parse_args(argv)
+    formats = [fmt.strip() for fmt in args.formats.split(',') if fmt.strip()]
+    paths = get_log_paths(args.inputs)
+    report = run_export(paths, args.out, formats, args.orientation, args.workers, args.render_workers, args.force, args.table_format, args.memory)
+    seconds = max(report['seconds'], 1e-9)
+    print('logs exported: %d, skipped (up to date): %d, failed: %d' % (report['logs'], report['skipped'], len(report['failed'])))
+    print('images: %d, time: %.2f s, throughput: %.1f logs/s, %.0f cases/s, %.1f images/s' %
+          (report['images'], seconds, report['logs'] / seconds, report['cases'] / seconds, report['images'] / seconds))
+    if report['memory']:
+        print('peak memory by stage (the highest over the logs), MB: ' +
+              ', '.join('%s - %.1f' % (stage, qty / 2**20) for stage, qty in report['memory'].items()))
+    for path, msg in report['failed']: print('failed: %s - %s' % (path, msg), file = sys.stderr)
+    return 1 if report['failed'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
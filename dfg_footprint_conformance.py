@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Footprint conformance of many event logs against a reference log
+
+Every input file contains one event log as a string in the app format ('[<acd>45, <bce>42]').
+The footprints of all logs are compared with the footprint of the reference log at once
+(see get_footprint_conformance). Two CSV files are written:
+    <report>.csv              - fitness and number of mismatching cells of every log
+    <report>_mismatches.csv   - mismatching relations of every log
+Logs that can not be read or contain no traces are listed as failed and left out of the reports.
+
+Example
+-------
+python dfg_footprint_conformance.py reference.txt daily_logs/ --report conformance --min-fitness 0.95
+"""
+# packages
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+
+import directly_follows_graph as dfg
+from dfg_batch_export import get_log_paths
+
+def get_log_pairs(path):
+    '''
+    Arcs of the DFG of one log file (runs in the process pool)
+    '''
+    with open(path, encoding = 'utf-8') as f: df_log = dfg.get_df_log(f.read())
+    if len(df_log) == 0: raise ValueError('no traces found in %s' % (path))
+    DFG_nodes, DFG_arcs = dfg.get_DFG(list('I' + df_log['trace'] + 'O'), list(df_log['qty']))
+    return list(DFG_arcs['pair'])
+
+def get_log_result(path):
+    '''
+    Arcs of one log file (see get_log_pairs) or the error message (runs in the process pool):
+    a failed log does not stop the screening of the other logs
+
+    Returns
+    -------
+    (pairs, None) or (None, error message)
+    '''
+    try: return get_log_pairs(path), None
+    except Exception as ex_msg: return None, str(ex_msg)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Footprint conformance of event logs against a reference log')
+    parser.add_argument('reference', help = 'reference event log file')
+    parser.add_argument('inputs', nargs = '+', help = 'event log files or folders with *.txt files')
+    parser.add_argument('--report', default = 'conformance', help = 'name of the CSV reports (default: conformance)')
+    parser.add_argument('--min-fitness', type = float, default = 1.0, help = 'logs with a lower fitness are listed as drifted (default: 1.0)')
+    parser.add_argument('--workers', type = int, default = os.cpu_count(), help = 'discovery processes (default: number of cores)')
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    paths = get_log_paths(args.inputs)
+    ref_pairs = get_log_pairs(args.reference)
+    with concurrent.futures.ProcessPoolExecutor(max_workers = args.workers) as pool:
+        results = list(pool.map(get_log_result, paths, chunksize = max(1, len(paths) // (4 * (args.workers or 1)))))
+    failed = [(path, msg) for path, (pairs, msg) in zip(paths, results) if msg is not None]
+    paths = [path for path, (pairs, msg) in zip(paths, results) if msg is None]
+    pairs_list = [pairs for pairs, msg in results if msg is None]
+    df_conformance, df_mismatches = dfg.get_footprint_conformance(ref_pairs, pairs_list, 'I', 'O')
+    df_conformance.insert(1, 'path', paths)
+    df_mismatches.insert(1, 'path', [paths[n] for n in df_mismatches['log']])
+    df_conformance.to_csv(args.report + '.csv', index = False)
+    df_mismatches.to_csv(args.report + '_mismatches.csv', index = False)
+    drifted = df_conformance[df_conformance['fitness'] < args.min_fitness]
+    print('logs: %d, drifted (fitness < %.3f): %d, failed: %d, time: %.2f s' % (len(paths), args.min_fitness, len(drifted), len(failed),
+                                                                             time.perf_counter() - start))
+    for path, fitness in zip(drifted['path'], drifted['fitness']): print('%.3f  %s' % (fitness, path))
+    for path, msg in failed: print('failed: %s - %s' % (path, msg), file = sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
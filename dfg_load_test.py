@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Load test of the DFG web app: N concurrent sessions in one process, no network
+
+Every simulated session is a Streamlit AppTest of directly_follows_graph.py (streamlit >= 1.28, see requirements-dev.txt).
+A session selects the event log, goes through the five pages, moves the τ(act), τ(var) and τ(arc)
+sliders and submits the forms. All sessions share the process (and the shared log store) as
+the sessions of one app replica do. For every number of sessions and log size the test reports
+latency percentiles of the interactions, throughput and memory of the process. An interaction that fails
+(an exception on the page or in the AppTest run) is counted in 'errors', the session goes on.
+
+AppTest runs can not overlap in one process, so the sessions take turns (round robin): each
+interaction of every session is run in turn. 'service' is the measured run time of an interaction.
+'modelled_response' is a model, not a measurement: the time a session would wait if all sessions
+acted at the same time and the replica served them one by one (its own service time plus the
+service times of the sessions before it in the round). Real contention between concurrent reruns
+(threads, the GIL, locks of the shared store) is not measured.
+
+Example
+-------
+python dfg_load_test.py --sessions 1,5,20 --log-sizes 0,1000,10000 --walks 2 --csv load_test.csv
+(log size 0 - the default event log L1, otherwise - a random log with this number of variants)
+"""
+# packages
+import argparse
+import os
+import random
+import resource
+import sys
+import time
+
+import pandas as pd
+import numpy as np
+import streamlit as st
+
+app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'directly_follows_graph.py')
+pages = ['Baseline Discovery Algorithm','DFG matrix & footprint',
+         'Activity-Based Filtering','Variant-Based Filtering','Arc-Based Filtering']
+tau_sliders = ['Select a threshold τ(act)', 'Select a threshold τ(var)', 'Select a threshold τ(arc)']
+
+def get_random_log(n_variants, n_activities = 10, max_length = 12, seed = 0):
+    '''
+    Random event log as a string in the app format ('[<acd>45, <bce>42]')
+    '''
+    rnd = random.Random(seed)
+    activities = 'abcdefghijklmnopqrstuvwxyz'[:n_activities]
+    variants = (''.join(rnd.choice(activities) for _ in range(rnd.randint(1, max_length))) for _ in range(n_variants))
+    return '[' + ', '.join('<%s>%d' % (trace, rnd.randint(1, 100)) for trace in variants) + ']'
+
+def get_memory_mb():
+    '''
+    Current and peak resident memory of the process, MB
+    '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    try:
+        with open('/proc/self/status') as f:
+            rss = [int(line.split()[1]) / 1024 for line in f if line.startswith('VmRSS:')][0]
+    except OSError: rss = peak
+    return rss, peak
+
+def get_widget(widgets, label):
+    '''
+    Widget of the AppTest by the beginning of its label
+    '''
+    return [w for w in widgets if w.label.startswith(label)][0]
+
+def run_session(str_log, walks, timeout):
+    '''
+    One simulated session: selection of the log, then `walks` times through all pages.
+    The session is a generator, it stops after every interaction.
+
+    Yields
+    -------
+    tuples (interaction, run time in seconds, True if the interaction failed)
+    '''
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(app_path, default_timeout = timeout)
+    def interact(name, element):
+        start = time.perf_counter()
+        try: element.run()
+        except Exception: return name, time.perf_counter() - start, True   # e.g. a timeout of the run
+        return name, time.perf_counter() - start, len(at.exception) > 0
+    yield interact('open', at)
+    if str_log is not None:
+        get_widget(at.radio, 'Choose one of the default event logs').set_value('Create event log')
+        yield interact('select log', at)
+        get_widget(at.text_input, 'Input your event log').set_value(str_log)
+        yield interact('input log', at)
+    for _ in range(walks):
+        for page in pages:
+            get_widget(at.sidebar.radio, '**Directly Follows Graph').set_value(page)
+            yield interact('page', at)
+            sliders = [w for w in at.slider if w.label.startswith(tuple(tau_sliders))]
+            if sliders:   # filter pages: move the threshold (the other sliders are in the forms)
+                slider = sliders[0]
+                for share in (0.25, 0.5, 1.0):
+                    slider.set_value(int(slider.max * share))
+                    yield interact('slider', at)
+            if at.button: yield interact('submit', at.button[0].click())
+
+def run_load_test(n_sessions, str_log, walks, timeout):
+    '''
+    n_sessions concurrent sessions on the same log with cold caches at the start
+
+    Returns
+    -------
+    report : dict
+        latency percentiles (ms), throughput (interactions/s), errors and memory (MB);
+        modelled_response_* - modelled, not measured (see the module docstring)
+    '''
+    st.cache_resource.clear()
+    sessions = [run_session(str_log, walks, timeout) for _ in range(n_sessions)]
+    service, response, errors = [], [], 0   # response - modelled: sessions served one by one
+    start = time.perf_counter()
+    while sessions:
+        # one round: every session sends its next interaction at the same time
+        round_start, active = time.perf_counter(), []
+        for session in sessions:
+            try: name, seconds, failed = next(session)
+            except StopIteration: continue
+            except Exception:   # the widgets of a failed run are missing, the session ends
+                errors += 1
+                continue
+            service.append(seconds)
+            response.append(time.perf_counter() - round_start)
+            errors += failed
+            active.append(session)
+        sessions = active
+    seconds = time.perf_counter() - start
+    service, response = np.array(service) * 1000, np.array(response) * 1000
+    rss, peak = get_memory_mb()
+    return {'interactions': len(service), 'errors': errors,
+            'service_p50_ms': np.percentile(service, 50), 'service_p99_ms': np.percentile(service, 99),
+            'modelled_response_p50_ms': np.percentile(response, 50), 'modelled_response_p90_ms': np.percentile(response, 90),
+            'modelled_response_p99_ms': np.percentile(response, 99),
+            'throughput': len(service) / seconds, 'rss_mb': rss, 'peak_rss_mb': peak}
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Load test of the DFG web app with concurrent simulated sessions')
+    parser.add_argument('--sessions', default = '1,5,10', help = 'numbers of concurrent sessions, comma separated (default: 1,5,10)')
+    parser.add_argument('--log-sizes', default = '0,1000', help = 'numbers of variants of random logs, 0 - default log L1 (default: 0,1000)')
+    parser.add_argument('--walks', type = int, default = 1, help = 'walks through all pages per session (default: 1)')
+    parser.add_argument('--timeout', type = float, default = 120, help = 'timeout of one interaction, s (default: 120)')
+    parser.add_argument('--csv', default = None, help = 'save the report as CSV')
+    args = parser.parse_args(argv)
+    try: from streamlit.testing.v1 import AppTest   # noqa: F401
+    except ImportError:
+        print('The load test needs streamlit >= 1.28 (streamlit.testing.v1.AppTest), found %s' % (st.__version__), file = sys.stderr)
+        return 1
+    rows = []
+    for log_size in [int(x) for x in args.log_sizes.split(',')]:
+        str_log = get_random_log(log_size) if log_size > 0 else None
+        for n_sessions in [int(x) for x in args.sessions.split(',')]:
+            report = run_load_test(n_sessions, str_log, args.walks, args.timeout)
+            rows.append(dict({'log_variants': log_size, 'sessions': n_sessions}, **report))
+            print('log variants: %d, sessions: %d - done' % (log_size, n_sessions), file = sys.stderr)
+    print(pd.DataFrame(rows).round(1).to_string(index = False))
+    print('modelled_response_*: sessions served one by one in rounds (sum of service times), concurrent contention is not measured')
+    if args.csv: pd.DataFrame(rows).to_csv(args.csv, index = False)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Precomputed result bundles of the default event logs L1-L8 (build step before starting the app)
+
+For every default log the results of all shared functions of the app are computed and saved
+to <out>/<version>/<log>.pkl (see get_bundles): the parsed log and its DFG, DFG images for both
+orientations and all arc metrics, DFG matrices & footprints for all relations, export files and
+the results of the activity-, variant- and arc-based filters with their images at every slider value.
+Slider values with equal filter results share one result and one rendering.
+The version is a hash of the code of the app and of this step and of the package versions (see get_bundle_version):
+after a change of the code the app does not load the old bundles, the step must be run again.
+
+Example
+-------
+python dfg_precompute.py --out dfg_bundles
+streamlit run directly_follows_graph.py
+"""
+# packages
+import argparse
+import concurrent.futures
+import itertools
+import os
+import pickle
+import sys
+import time
+
+import directly_follows_graph as dfg
+
+default_logs = ['L1','L2','L3','L4','L5','L6','L7','L8']
+orientations = ['LR','TB']
+relations = [1] + list(range(2, 11)) + [None]   # directly-follows, k-step (k = 2..10), eventually-follows
+
+def get_filter_results(str_log, shared_log, kind, metric, cache):
+    '''
+    Results of one filter at every slider value of its page, equal results are the same object.
+    The results of the activity- and variant-based filters are computed once per log for all metrics:
+    cache - {(kind, key): result} of the log
+
+    Returns
+    -------
+    results : dict
+        {slider value: (key, DFG_nodes, DFG_arcs, result)}, key - filter argument of get_shared_filtered_vDFG,
+        result - value of get_activity_filtered / get_variant_filtered (None for 'arc')
+    '''
+    DFG_nodes, DFG_arcs = shared_log['DFG_nodes'], shared_log['DFG_arcs']
+    results, distinct = dict(), dict()
+    if kind == 'act': max_tau = int(DFG_nodes['qty'].max())
+    elif kind == 'var': max_tau = shared_log['max_qty']
+    else: max_tau = int(DFG_arcs[metric].max())
+    for tau in range(max_tau + 1):
+        if kind == 'act':   # the same subset of activities as on the page
+            key = tuple(['I'] + list(DFG_nodes['act'][(DFG_nodes['qty'] >= tau) & (~DFG_nodes['act'].isin(['I','O']))]) + ['O'])
+            if (kind, key) not in cache: cache[kind, key] = dfg.get_activity_filtered(str_log, shared_log, key)
+            result = cache[kind, key]
+            filtered = result[1:]
+        elif kind == 'var':
+            key = tau
+            if (kind, key) not in cache: cache[kind, key] = dfg.get_variant_filtered(str_log, shared_log, tau)
+            result = cache[kind, key]
+            filtered = result
+        else:
+            key, result = tau, None
+            filtered = (DFG_nodes, DFG_arcs[DFG_arcs[metric] >= tau])
+        signature = (filtered[0].to_csv(), filtered[1].to_csv())
+        if signature not in distinct: distinct[signature] = (key, filtered[0], filtered[1], result)
+        results[tau] = (key,) + distinct[signature][1:]
+    return results
+
+def get_log_bundle(L, version):
+    '''
+    Result bundle of one default event log (runs in the process pool): the log is parsed and its trie
+    is built once, the results are computed by the functions behind the shared functions of the app
+    (the Streamlit caches are not used outside the app)
+    '''
+    str_log = dfg.get_default_event_log(L)
+    shared_log = dfg.get_log_results(str_log, dfg.stream_preview_rows)
+    df_variants_IO = shared_log['df_variants_IO']
+    trie = dfg.get_variant_trie(list(df_variants_IO['trace']), list(df_variants_IO['qty'])) if dfg.is_relation_trie(str_log, shared_log) else None
+    bundle = {'version': version, 'log': L, 'str_log': str_log, 'shared_log': {dfg.stream_preview_rows: shared_log},
+              'vDFG': dict(), 'footprint': dict(), 'export': dict(),
+              'activity_filtered': dict(), 'variant_filtered': dict(), 'filtered_vDFG': dict()}
+    for orientation, metric in itertools.product(orientations, dfg.arc_metrics):
+        bundle['vDFG'][orientation, metric] = dfg.get_vDFG(shared_log['DFG_arcs'], shared_log['DFG_nodes'], orientation, 'I', 'O', metric = metric)
+    for k in relations: bundle['footprint'][k] = dfg.get_footprint_results(str_log, shared_log, k, trie)
+    for fmt in dfg.export_formats: bundle['export'][fmt] = dfg.get_export_results(shared_log, fmt)
+    # filters: every distinct result is rendered once for each orientation and metric
+    cache = dict()
+    for kind, metric in itertools.product(['act','var','arc'], dfg.arc_metrics):
+        images = dict()
+        for tau, (key, DFG_nodes, DFG_arcs, result) in get_filter_results(str_log, shared_log, kind, metric, cache).items():
+            if kind == 'act': bundle['activity_filtered'][key] = result
+            elif kind == 'var': bundle['variant_filtered'][key] = result
+            for orientation in orientations:
+                if (id(DFG_arcs), orientation) not in images:
+                    images[id(DFG_arcs), orientation] = dfg.get_vDFG(DFG_arcs, DFG_nodes, orientation, 'I', 'O', metric = metric)
+                bundle['filtered_vDFG'][kind, key, orientation, metric] = images[id(DFG_arcs), orientation]
+    return bundle
+
+def save_bundle(path, bundle):
+    '''
+    Saving the bundle: written to a temporary file first, so the app never loads a partial file
+    '''
+    with open(path + '.tmp', 'wb') as f: pickle.dump(bundle, f, protocol = pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Precomputed result bundles of the default event logs')
+    parser.add_argument('--out', default = dfg.bundle_dir, help = 'bundle folder (default: %s)' % (dfg.bundle_dir))
+    parser.add_argument('--logs', default = ','.join(default_logs), help = 'default logs, comma separated (default: L1-L8)')
+    parser.add_argument('--workers', type = int, default = os.cpu_count(), help = 'processes (default: number of cores)')
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    dfg.check_kernels()   # the bundles are computed by the kernels of this backend
+    version = dfg.get_bundle_version()
+    version_dir = os.path.join(args.out, version)
+    os.makedirs(version_dir, exist_ok = True)
+    logs = [L.strip() for L in args.logs.split(',') if L.strip()]
+    with concurrent.futures.ProcessPoolExecutor(max_workers = args.workers) as pool:
+        for L, bundle in zip(logs, pool.map(get_log_bundle, logs, itertools.repeat(version))):
+            save_bundle(os.path.join(version_dir, L + '.pkl'), bundle)
+            results = list(bundle['activity_filtered'].values()) + list(bundle['variant_filtered'].values())
+            print('%s: %d images, %d distinct filter results' % (L, len(bundle['vDFG']) + len(set(map(id, bundle['filtered_vDFG'].values()))),
+                                                                len(set(map(id, results)))))
+    print('bundles %s: %d logs, time: %.2f s' % (version_dir, len(logs), time.perf_counter() - start))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
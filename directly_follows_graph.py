@@ -8,13 +8,23 @@ A streamlit web app "Process Mining training" - "Directly-Follows Graph (DFG)" m
 # packages
 import streamlit as st
 import pandas as pd
+import numpy as np
 import graphviz
 import itertools
 import re
+import os
+import collections
+import threading
+import sys
+import io
+import hashlib
+import pickle
+import tempfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+try: import numba   # optional - compiled counting kernels
+except ImportError: numba = None
 
-# default settings of the page
-st.set_page_config(page_title="PM-training (DFG)", page_icon=":rocket:", 
-                   layout= "wide", initial_sidebar_state="expanded")
 # hide right menu and logo at the bottom 
 hide_streamlit_style = """
                        <style>
@@ -22,9 +32,24 @@ hide_streamlit_style = """
                        footer {visibility: hidden;}
                        </style>
                        """
-st.markdown(hide_streamlit_style, unsafe_allow_html=True)              
+# memory budget of the in-memory discovery per event log, MB
+memory_budget_mb = int(os.environ.get('DFG_MEMORY_BUDGET_MB', '1024'))
+# upper estimates of memory per character of the log string, bytes (peaks measured by tracemalloc):
+# in-memory discovery by the kernels (up to 25) and the trie of the k-step relations (up to 335, long unique traces)
+memory_per_char = 32
+trie_memory_per_char = 400
+trie_node_bytes = 360   # measured size of one trie node (dict with 'qty', 'end', 'next')
+stream_preview_rows = 1000   # variants of a log in the streaming mode kept for the tables (see get_shared_log)
+max_spill_partitions = 256   # temporary files of the variant merge of the streaming discovery (see get_variant_chunks)
+# precomputed result bundles of the default event logs (see dfg_precompute.py)
+bundle_dir = os.environ.get('DFG_BUNDLE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dfg_bundles'))
 
 def main():
+    # default settings of the page (in main() so the module can be imported by the batch tools)
+    st.set_page_config(page_title="PM-training (DFG)", page_icon=":rocket:", 
+                       layout= "wide", initial_sidebar_state="expanded")
+    st.markdown(hide_streamlit_style, unsafe_allow_html=True)              
+    get_bundles()   # load the precomputed bundles once per process
     # =============================================================================
     LNG = 'en'                  # interface language
     md_text = get_dict_text()   # dict with markdown texts
@@ -36,6 +61,8 @@ def main():
                              'Activity-Based Filtering','Variant-Based Filtering','Arc-Based Filtering'
                              ]) 
     dfg_orientation = st.sidebar.radio('**DFG orientation (Left → Right or Top → Bottom)**',['LR','TB'],index = 0, horizontal = True)
+    dfg_metric_name = st.sidebar.radio('**DFG arc labels and τ(arc) metric**', [arc_metric_names[m] for m in arc_metrics], index = 0)
+    dfg_metric = arc_metrics[[arc_metric_names[m] for m in arc_metrics].index(dfg_metric_name)]
     st.sidebar.markdown('---')
     st.sidebar.markdown(md_text['left_block_author_refs',LNG])                    
     # =============================================================================   
@@ -69,10 +96,18 @@ def main():
     # common block #2 - check the selected event log 
     with st.expander("Check the selected event log in the table format", expanded = True): 
         try:
-            df_log = get_df_log(selected_log)
+            shared_log = get_shared_log(selected_log)   # parsed once per process, read-only
+            df_log = shared_log['df_log']
             if len(df_log)==0: raise Exception ('Error! Check your input data')   # simple error test
-            st.write(df_log)   # show DataFrame
-        except Exception as ex_msg: st.warning(ex_msg)        
+            if shared_log['stream']:   # log is too large for the in-memory discovery
+                st.info(md_text['cb_streaming_mode',LNG] % (shared_log['memory']['estimate'] / 2**20, memory_budget_mb, len(df_log)))
+            show_table(st, df_log, 'log')   # show DataFrame
+            st.caption('Memory of the log, MB: ' + ', '.join('%s - %.1f' % (part, qty / 2**20) 
+                                                           for part, qty in shared_log['memory'].items() if part != 'estimate') +
+                       '; all shared logs - %.1f of %d' % (get_memory_store()['bytes'] / 2**20, memory_budget_mb))
+        except Exception as ex_msg:
+            st.warning(ex_msg)
+            st.stop()   # the pages need a parsed log
     
     # =========================================================================
     # Exercise #1 - DFG (Baseline Discovery Algorithm)
@@ -85,9 +120,9 @@ def main():
                 # =========================================================================
                 # executive python code
                 # =========================================================================
-                df_log['trace'] = 'I' + df_log['trace'] + 'O'  # add start & end
-                DFG_nodes, DFG_arcs = get_DFG (list(df_log['trace']), list(df_log['qty'])) # get DFG nodes & arcs
-                vDFG = get_vDFG(DFG_arcs, DFG_nodes, dfg_orientation,'I','O')   # construct DFG as graphviz object
+                df_log_IO = shared_log['df_log_IO']  # log with start & end added to each trace
+                DFG_nodes, DFG_arcs = shared_log['DFG_nodes'], shared_log['DFG_arcs'] # get DFG nodes & arcs
+                vDFG = get_shared_vDFG(selected_log, dfg_orientation, dfg_metric)   # construct DFG as graphviz object
                 # =========================================================================
                 # web-page             
                 # Show Definition (Baseline Discovery Algorithm for DFG)
@@ -97,7 +132,7 @@ def main():
                 
                 # STEP 1. Add Start (I) and End (O) to all traces
                 st.markdown(md_text['p1_step_1_add_I_O',LNG])
-                st.write(df_log) # visualization df_log as an intermediate result
+                show_table(st, df_log_IO, 'p1_log') # visualization df_log as an intermediate result
                 with st.expander("Step 1 (example)", expanded = True):
                     st.info(md_text['p1_step_1_algorithm',LNG])    # example for step 1
 
@@ -105,13 +140,13 @@ def main():
                 
                 # STEP 2. Calculate a set of activities A with their  frequencies for DFG = (A,F) 
                 st.markdown(md_text['p1_step_2_title',LNG])                
-                st.write(DFG_nodes)    # visualization DFG_nodes as an intermediate result
+                show_table(st, DFG_nodes, 'p1_nodes')    # visualization DFG_nodes as an intermediate result
                 with st.expander("Step 2 (example)", expanded = True): # example for step 2
                     st.info(md_text['p1_step_2_algorithm',LNG])                     
               
                 # STEP 3. Calculate a set of arcs F with their frequencies for DFG = (A,F)
                 st.markdown(md_text['p1_step_3_title',LNG])
-                st.write(DFG_arcs)    # visualization DFG_arcs as an intermediate result
+                show_table(st, DFG_arcs, 'p1_arcs')    # visualization DFG_arcs as an intermediate result
                 with st.expander("Step 3 (example)", expanded = True):
                     st.info(md_text['p1_step_3_algorithm',LNG])     # example for step 2
                 
@@ -120,6 +155,19 @@ def main():
                 st.image(vDFG) # show DFG
                 st.markdown(md_text['p1_step_4_summary',LNG])
                 st.success(md_text['p1_step_1_2_3_4_summary',LNG], icon="✅")
+        # bulk export of the DFG for other tools: the files are built on request only
+        # (download buttons can not be placed in a form)
+        with st.expander("Export the DFG (Parquet / Arrow, sparse matrix)", expanded = False):
+            st.markdown(md_text['p1_export',LNG])
+            with st.form('Prepare the export files'):
+                export_fmt = st.radio('Table format', list(export_formats), index = 0, horizontal = True)
+                st_submitt_export = st.form_submit_button('Prepare the export files')
+            if st_submitt_export:
+                files = get_shared_export(selected_log, export_fmt)
+                cols = st.columns(4)
+                for col, (key, data) in zip(cols, files.items()):
+                    file_name = os.path.basename(get_export_paths('', 'dfg', export_fmt)[key])
+                    col.download_button(key, data, file_name = file_name, mime = 'application/octet-stream', key = 'p1_export_' + key)
                 
     # =========================================================================
     # Exercise #2 - DFG matrix & footprint
@@ -127,21 +175,25 @@ def main():
     elif (page == 'DFG matrix & footprint'): 
         st.markdown('##### Constructing a DFG matrix and DFG footprint')  
         with st.form('Get DFG matrix representation & DFG footprint'):
+            # relation between activities: directly-follows (k = 1), k-step (within k steps) or eventually-follows
+            col1, col2 = st.columns([2,1])
+            relation = col1.radio('Relation between activities', ['directly-follows','k-step','eventually-follows'], index = 0, horizontal = True)
+            relation_k = col2.slider('k (for k-step)', min_value = 2, max_value = 10, value = 2, step = 1)
             st_submitt_get_dfg_footprint = st.form_submit_button('Get DFG matrix representation & DFG footprint')
             if st_submitt_get_dfg_footprint:
                 # =========================================================================
                 # executive python code
                 # =========================================================================
-                df_log['trace'] = 'I' + df_log['trace'] + 'O'  # add start & end
-                DFG_nodes, DFG_arcs = get_DFG (list(df_log['trace']), list(df_log['qty'])) # get DFG nodes & arcs
-                # construct DFG matrix and footprint
-                df_footprint, dict_footprint, df_dfg_matrix, dict_dfg_matrix = get_footprint_matrix(list(DFG_arcs['pair']),list(DFG_arcs['qty']),'I','O')
+                # construct DFG matrix and footprint (shared between sessions)
+                relation_k = {'directly-follows': 1, 'k-step': relation_k, 'eventually-follows': None}[relation]
+                df_footprint, dict_footprint, df_dfg_matrix, dict_dfg_matrix = get_shared_footprint_matrix(selected_log, relation_k)
+                if relation_k != 1: st.info(md_text['p2_relation_note',LNG] % (relation if relation_k is None else '%d-step' % (relation_k)))
                 # =========================================================================
                 # web-page forming                
                 # DFG matrix
                 st.markdown(md_text['p2_step_1_title',LNG]) 
                 st.markdown(md_text['p2_dfg_matrix_intro',LNG])
-                st.write(df_dfg_matrix)
+                show_matrix(st, df_dfg_matrix, 'p2_matrix')
                 with st.expander("Step 1 (example)", expanded = True):
                     st.info(md_text['p2_step_1_algorithm',LNG])    # example for step 1                    
                 st.markdown(md_text['p2_dfg_matrix_comment',LNG])
@@ -150,7 +202,7 @@ def main():
                 st.markdown(md_text['p2_dfg_footprint_intro',LNG])
                 with st.expander("Definition (Footprint) [1]", expanded = True):
                     st.info(md_text['p2_dfg_footprint_definition',LNG])
-                st.write(df_footprint)
+                show_matrix(st, df_footprint, 'p2_footprint')
                 with st.expander("Step 2 (example)", expanded = True):
                     st.info(md_text['p2_step_2_algorithm',LNG])    # example for step 2     
 
@@ -167,9 +219,9 @@ def main():
         # =========================================================================
         # executive python code
         # DFG based on the original event log
-        df_log['trace'] = 'I' + df_log['trace'] + 'O'  # add start & end to each trace (original)
-        DFG_nodes, DFG_arcs = get_DFG (list(df_log['trace']), list(df_log['qty'])) # get DFG nodes & arcs (original)
-        vDFG = get_vDFG(DFG_arcs, DFG_nodes, dfg_orientation,'I','O')   # construct DFG as graphviz object (original)
+        df_log_IO = shared_log['df_log_IO']  # log with start & end added to each trace (original)
+        DFG_nodes, DFG_arcs = shared_log['DFG_nodes'], shared_log['DFG_arcs'] # get DFG nodes & arcs (original)
+        vDFG = get_shared_vDFG(selected_log, dfg_orientation, dfg_metric)   # construct DFG as graphviz object (original)
         # =========================================================================
         max_activity_slider = int(DFG_nodes['qty'].sort_values().max())    # max frequency value for the slider
         # =========================================================================
@@ -182,7 +234,7 @@ def main():
         col1.markdown(md_text['p3_slider_comment',LNG] % (activity_frequency))
         # column 2
         col2.markdown(md_text['p3_full_a_tab',LNG])
-        col2.write(DFG_nodes[~DFG_nodes['act'].isin(['I','O'])])
+        show_table(col2, DFG_nodes[~DFG_nodes['act'].isin(['I','O'])], 'p3_nodes_full')
         # column 3
         col3.markdown(md_text['p3_filtered_a_tab',LNG] % (activity_frequency))
         # =========================================================================
@@ -190,7 +242,7 @@ def main():
         # get dataframe with filtered activities
         abf_A = DFG_nodes[(DFG_nodes['qty'] >= activity_frequency)&(~DFG_nodes['act'].isin(['I','O']))].copy()
         # =========================================================================
-        col3.write(abf_A)
+        show_table(col3, abf_A, 'p3_nodes_filtered')
         col3.markdown(md_text['p3_note_start_end',LNG])
         # =========================================================================
         
@@ -200,24 +252,18 @@ def main():
                 # step 1 - Get the projection of L on a subset of filtered activities A
                 # =========================================================================
                 # executive python code
-                # get the projecion of trace on a subset of activities               
-                def get_trace_projection(trace, act):
-                    res = []
-                    for s in trace: 
-                        if (s in act): res.append(s)
-                    return ''.join(res)                
-                df_log['trace_projection'] = list(map(lambda trace: get_trace_projection(trace, list(abf_A['act'])), df_log['trace']))
-                df_log['trace_projection'] = 'I' + df_log['trace_projection'] + 'O'  # add start & end
+                # get the projecion of the log on a subset of activities (start & end are kept)
+                abf_L, abf_DFG_nodes, abf_DFG_arcs = get_shared_activity_filtered(selected_log, tuple(['I'] + list(abf_A['act']) + ['O']))
                 # =========================================================================   
                 st.markdown(md_text['p3_step_1_title',LNG])
-                st.write(df_log)                
+                show_table(st, abf_L, 'p3_log_projection')                
                 with st.expander("Step 1 (example)", expanded = True):
                     st.info(md_text['p3_step_1_example',LNG])
                 # step 1 - Get the projection of L on a subset of filtered activities A
                 # =========================================================================
                 # executive python code
-                abf_DFG_nodes, abf_DFG_arcs = get_DFG (list(df_log['trace_projection']), list(df_log['qty'])) # get DFG nodes & arcs after filtering
-                abf_vDFG = get_vDFG(abf_DFG_arcs, abf_DFG_nodes, dfg_orientation,'I','O')   # construct DFG as graphviz object
+                # abf_DFG_nodes, abf_DFG_arcs - DFG nodes & arcs after filtering (computed with the projection)
+                abf_vDFG = get_shared_filtered_vDFG(selected_log, 'act', tuple(['I'] + list(abf_A['act']) + ['O']), dfg_orientation, dfg_metric)   # construct DFG as graphviz object
                 # =========================================================================
                 st.markdown(md_text['p3_step_2_title',LNG])
                 st.markdown(md_text['p3_step_2_subtitle',LNG])
@@ -225,16 +271,16 @@ def main():
                 col1,col2,col3,col4 = st.columns([1,1,1,1])    
                 # col 1
                 col1.markdown(md_text['p3_step_2_col1_original_nodes',LNG])
-                col1.dataframe(DFG_nodes)
+                show_table(col1, DFG_nodes, 'p3_nodes')
                 #col 2
                 col2.markdown(md_text['p3_step_2_col2_original_arcs',LNG])
-                col2.dataframe(DFG_arcs)
+                show_table(col2, DFG_arcs, 'p3_arcs')
                 #col 3
                 col3.markdown(md_text['p3_step_2_col3_filtered_nodes',LNG])
-                col3.write(abf_DFG_nodes)     
+                show_table(col3, abf_DFG_nodes, 'p3_abf_nodes')     
                 # col 4
                 col4.markdown(md_text['p3_step_2_col4_filtered_arcs',LNG])
-                col4.write(abf_DFG_arcs)
+                show_table(col4, abf_DFG_arcs, 'p3_abf_arcs')
                 # original & filtered visual DFGs in 2 columns  
                 col1,col2 = st.columns([1,1])
                 # col 1
@@ -257,11 +303,11 @@ def main():
         # =========================================================================
         # executive python code
         # DFG based on the original event log
-        df_log['trace'] = 'I' + df_log['trace'] + 'O'  # add start & end to each trace (original)
-        DFG_nodes, DFG_arcs = get_DFG (list(df_log['trace']), list(df_log['qty'])) # get DFG nodes & arcs (original)
-        vDFG = get_vDFG(DFG_arcs, DFG_nodes, dfg_orientation,'I','O')   # construct DFG as graphviz object (original)
+        df_log_IO = shared_log['df_log_IO']  # log with start & end added to each trace (original)
+        DFG_nodes, DFG_arcs = shared_log['DFG_nodes'], shared_log['DFG_arcs'] # get DFG nodes & arcs (original)
+        vDFG = get_shared_vDFG(selected_log, dfg_orientation, dfg_metric)   # construct DFG as graphviz object (original)
         # =========================================================================
-        max_variant_slider = int(df_log['qty'].sort_values().max())    # max frequency value for the slider  
+        max_variant_slider = shared_log['max_qty']    # max frequency value for the slider  
         # =========================================================================
         # Slider for tau(var), full log and filtered log in 3 columns      
         col1,col2,col3 = st.columns([1,1,2])      
@@ -272,17 +318,18 @@ def main():
         col1.markdown(md_text['p4_slider_comment',LNG] % (variant_frequency))
         # column 2
         col2.markdown(md_text['p4_full_v_tab',LNG])
-        col2.write(df_log.sort_values(by=['qty'], ascending=False))
+        df_variants_IO = shared_log['df_variants_IO']  # variants: equal traces merged, their frequencies summed
+        show_table(col2, df_variants_IO, 'p4_log_full')
         # column 3
         col3.markdown(md_text['p4_filtered_v_tab',LNG] % (variant_frequency))
         # =========================================================================
         # executive python code
         # get dataframe with filtered activities
-        vbf_L = df_log[df_log['qty'] >= variant_frequency].sort_values(by=['qty'], ascending=False).copy()
-        vbf_DFG_nodes, vbf_DFG_arcs = get_DFG (list(vbf_L['trace']), list(vbf_L['qty'])) # get DFG nodes & arcs after filtering
-        vbf_vDFG = get_vDFG(vbf_DFG_arcs, vbf_DFG_nodes, dfg_orientation,'I','O')   # construct DFG as graphviz object        
+        vbf_L = df_variants_IO[df_variants_IO['qty'] >= variant_frequency]
+        vbf_DFG_nodes, vbf_DFG_arcs = get_shared_variant_filtered(selected_log, variant_frequency) # get DFG nodes & arcs after filtering
+        vbf_vDFG = get_shared_filtered_vDFG(selected_log, 'var', variant_frequency, dfg_orientation, dfg_metric)   # construct DFG as graphviz object        
         # =========================================================================
-        col3.write(vbf_L)
+        show_table(col3, vbf_L, 'p4_log_filtered')
         # =========================================================================
         
         with st.form('Apply the Variant-Based Filtering'):
@@ -294,16 +341,16 @@ def main():
                 col1,col2,col3,col4 = st.columns([1,1,1,1])    
                 # col 1
                 col1.markdown(md_text['p4_step_1_col1_original_nodes',LNG])
-                col1.dataframe(DFG_nodes)
+                show_table(col1, DFG_nodes, 'p4_nodes')
                 #col 2
                 col2.markdown(md_text['p4_step_1_col2_original_arcs',LNG])
-                col2.dataframe(DFG_arcs)
+                show_table(col2, DFG_arcs, 'p4_arcs')
                 #col 3
                 col3.markdown(md_text['p4_step_1_col3_filtered_nodes',LNG])
-                col3.write(vbf_DFG_nodes)     
+                show_table(col3, vbf_DFG_nodes, 'p4_vbf_nodes')     
                 # col 4
                 col4.markdown(md_text['p4_step_1_col4_filtered_arcs',LNG])
-                col4.write(vbf_DFG_arcs)
+                show_table(col4, vbf_DFG_arcs, 'p4_vbf_arcs')
                 # original & filtered visual DFGs in 2 columns  
                 col1,col2 = st.columns([1,1])
                 # col 1
@@ -327,11 +374,10 @@ def main():
         # =========================================================================
         # executive python code
         # DFG based on the original event log
-        df_log['trace'] = 'I' + df_log['trace'] + 'O'  # add start & end to each trace (original)
-        DFG_nodes, DFG_arcs = get_DFG (list(df_log['trace']), list(df_log['qty'])) # get DFG nodes & arcs (original)
-        vDFG = get_vDFG(DFG_arcs, DFG_nodes, dfg_orientation,'I','O')   # construct DFG as graphviz object (original)
+        DFG_nodes, DFG_arcs = shared_log['DFG_nodes'], shared_log['DFG_arcs'] # get DFG nodes & arcs (original)
+        vDFG = get_shared_vDFG(selected_log, dfg_orientation, dfg_metric)   # construct DFG as graphviz object (original)
         # =========================================================================
-        max_arc_slider = int(DFG_arcs['qty'].sort_values().max())    # max frequency value for the slider
+        max_arc_slider = int(DFG_arcs[dfg_metric].sort_values().max())    # max frequency value for the slider
         # =========================================================================
         # Slider for tau(arc), full arcs and filtered arcs in 3 columns      
         col1,col2,col3 = st.columns([1,1,2])      
@@ -342,17 +388,17 @@ def main():
         col1.markdown(md_text['p5_slider_comment',LNG] % (arc_frequency))
         # column 2
         col2.markdown(md_text['p5_full_arc_tab',LNG])
-        col2.write(DFG_arcs)
+        show_table(col2, DFG_arcs, 'p5_arcs_full')
         # column 3
         col3.markdown(md_text['p5_filtered_arc_tab',LNG] % (arc_frequency))
         # =========================================================================
         # executive python code
         # get dataframe with filtered activities
-        arc_bf_DFG_arcs = DFG_arcs[DFG_arcs['qty'] >= arc_frequency].copy()
-        arc_bf_DFG_nodes = DFG_nodes.copy()
-        arc_bf_vDFG = get_vDFG(arc_bf_DFG_arcs, arc_bf_DFG_nodes, dfg_orientation,'I','O')   # construct DFG as graphviz object        
+        arc_bf_DFG_arcs = DFG_arcs[DFG_arcs[dfg_metric] >= arc_frequency]
+        arc_bf_DFG_nodes = DFG_nodes   # nodes are not changed by the filter
+        arc_bf_vDFG = get_shared_filtered_vDFG(selected_log, 'arc', arc_frequency, dfg_orientation, dfg_metric)   # construct DFG as graphviz object        
         # =========================================================================
-        col3.write(arc_bf_DFG_arcs)
+        show_table(col3, arc_bf_DFG_arcs, 'p5_arcs_filtered')
         # =========================================================================
         
         with st.form('Apply the Arc-Based Filtering'):
@@ -364,16 +410,16 @@ def main():
                 col1,col2,col3,col4 = st.columns([1,1,1,1])    
                 # col 1
                 col1.markdown(md_text['p5_step_1_col1_original_nodes',LNG])
-                col1.dataframe(DFG_nodes)
+                show_table(col1, DFG_nodes, 'p5_nodes')
                 #col 2
                 col2.markdown(md_text['p5_step_1_col2_original_arcs',LNG])
-                col2.dataframe(DFG_arcs)
+                show_table(col2, DFG_arcs, 'p5_arcs')
                 #col 3
                 col3.markdown(md_text['p5_step_1_col3_filtered_nodes',LNG])
-                col3.write(arc_bf_DFG_nodes)     
+                show_table(col3, arc_bf_DFG_nodes, 'p5_arc_bf_nodes')     
                 # col 4
                 col4.markdown(md_text['p5_step_1_col4_filtered_arcs',LNG])
-                col4.write(arc_bf_DFG_arcs)
+                show_table(col4, arc_bf_DFG_arcs, 'p5_arc_bf_arcs')
                 # original & filtered visual DFGs in 2 columns  
                 col1,col2 = st.columns([1,1])
                 # col 1
@@ -396,13 +442,745 @@ def get_df_log(str_log):
     Event log transformation from str ('[<acd>45, <bce>42]') to pandas.DataFrame (columns = ['trace','qty'])
     '''
     return pd.DataFrame({'trace':re.findall('[a-z]+', str_log),'qty':[int(s) for s in re.findall('[0-9]+', str_log)]})
+
+# =============================================================================
+# Shared log store: one copy per process for all sessions.
+# The cached objects are returned to every session as they are (no copies),
+# so the pages must treat them as read-only and build new frames instead.
+# The frames are not made read-only: pandas 1.5 has no read-only DataFrame, the flags of
+# the block arrays are internal and many writes copy the blocks instead of failing, so the
+# flags would not protect the shared copy. The pages only select rows (new frames).
+# Logs estimated to exceed memory_budget_mb are not kept in memory: their DFGs are
+# computed by the streaming discovery and only the first variants are kept for the tables.
+# The log-sized results (parsed logs, projections) of all logs are kept in one store within
+# memory_budget_mb (see get_stored); the other shared results are small (|A| <= 28).
+# Results of the default event logs are taken from the precomputed bundles (see get_bundles).
+# =============================================================================
+def get_bundle_version():
+    '''
+    Version of the result bundles: hash of the code of the app and of the build step (dfg_precompute.py)
+    and of the versions of the packages the results depend on (bundles of other versions are not loaded)
+    '''
+    code = b''
+    for path in [os.path.abspath(__file__), os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dfg_precompute.py')]:
+        if os.path.isfile(path):
+            with open(path, 'rb') as f: code += f.read()
+    packages = ' '.join([pd.__version__, np.__version__, pa.__version__, graphviz.__version__])
+    return hashlib.sha256(code + packages.encode('utf-8')).hexdigest()[:16]
+
+@st.cache_resource(show_spinner = False)
+def get_bundles():
+    '''
+    Loading the result bundles of the current version (see get_bundle_version) from bundle_dir
+
+    Returns
+    -------
+    bundles : dict
+        {event log string: bundle}, bundle - dict with the results of the shared functions
+        ('shared_log', 'vDFG', 'footprint', 'export', 'activity_filtered', 'variant_filtered', 'filtered_vDFG')
+    '''
+    bundles = dict()
+    if not bundle_dir: return bundles
+    version_dir = os.path.join(bundle_dir, get_bundle_version())
+    if not os.path.isdir(version_dir): return bundles
+    for file_name in sorted(os.listdir(version_dir)):
+        if not file_name.endswith('.pkl'): continue
+        with open(os.path.join(version_dir, file_name), 'rb') as f: bundle = pickle.load(f)
+        bundles[bundle['str_log']] = bundle
+    return bundles
+
+def get_bundle(str_log, part, key):
+    '''
+    Precomputed result bundle[part][key] of the event log, None if there is no such result
+    '''
+    bundle = get_bundles().get(str_log)
+    return None if bundle is None else bundle[part].get(key)
+
+@st.cache_resource(show_spinner = False)
+def get_memory_store():
+    '''
+    Store of the log-sized shared results of the process: {'lock', 'results', 'bytes', 'computing'},
+    'results' - OrderedDict {key: (result, size)} from the least to the most recently used,
+    'computing' - {key: lock} of the results being computed (see get_stored)
+    '''
+    return {'lock': threading.Lock(), 'results': collections.OrderedDict(), 'bytes': 0, 'computing': dict()}
+
+def get_size(obj):
+    '''
+    Size estimate of a shared result in bytes: DataFrames by pandas (deep), tries by the number
+    of nodes (see trie_node_bytes), containers by their items
+    '''
+    if isinstance(obj, pd.DataFrame): return int(obj.memory_usage(index = True, deep = True).sum())
+    if isinstance(obj, dict) and ('next' in obj):
+        n, stack = 0, [obj]
+        while stack:
+            node = stack.pop()
+            n += 1
+            stack.extend(node['next'].values())
+        return n * trie_node_bytes
+    if isinstance(obj, dict): return sum(get_size(x) for x in obj.values())
+    if isinstance(obj, (tuple, list)): return sum(get_size(x) for x in obj)
+    return sys.getsizeof(obj)
+
+def get_stored_result(store, key):
+    '''
+    Result of the key from the store (marked as the most recently used), None if it is not kept
+    '''
+    with store['lock']:
+        if key not in store['results']: return None
+        store['results'].move_to_end(key)
+        return store['results'][key]
+
+def get_stored(key, compute):
+    '''
+    Shared result compute() from the memory store (see get_memory_store), computed once per key:
+    the sessions asking for a key being computed wait for it (lock of the key) instead of computing
+    it again, the other keys are served meanwhile. After a new result is added, the least recently
+    used results are dropped while the store is larger than memory_budget_mb (the new result is always kept).
+    '''
+    store = get_memory_store()
+    stored = get_stored_result(store, key)
+    if stored is not None: return stored[0]
+    with store['lock']: key_lock = store['computing'].setdefault(key, threading.Lock())
+    with key_lock:
+        stored = get_stored_result(store, key)   # computed by another session meanwhile
+        if stored is not None: return stored[0]
+        try:
+            result = compute()
+            size = get_size(result)
+            with store['lock']:
+                store['results'][key] = (result, size)
+                store['bytes'] += size
+                while (store['bytes'] > memory_budget_mb * 2**20) & (len(store['results']) > 1):
+                    dropped_key, (dropped, dropped_size) = store['results'].popitem(last = False)
+                    store['bytes'] -= dropped_size
+        finally:
+            with store['lock']: store['computing'].pop(key, None)
+    return result
+
+def get_shared_log(str_log, preview_rows = stream_preview_rows):
+    '''
+    Parsing the event log and discovering its DFG once per process (kept in the memory store)
+
+    Returns
+    -------
+    shared_log : dict
+        'df_log' - the event log (columns = ['trace','qty']), in the streaming mode - its first preview_rows variants,
+        'df_log_IO' - the same log with start (I) & end (O) added to each trace,
+        'df_variants_IO' - variants of df_log_IO (equal traces merged) in descending frequency,
+        'stream' - True if the log is too large for the in-memory discovery (see get_log_results),
+        'DFG_nodes', 'DFG_arcs' - the DFG of the log (see get_DFG),
+        'max_qty' - the highest variant frequency,
+        'memory' - the estimate for the whole log and the sizes of the kept 'log' and 'DFG' in bytes (see get_size)
+    '''
+    bundle = get_bundle(str_log, 'shared_log', preview_rows)
+    if bundle is not None: return bundle
+    return get_stored(('log', str_log, preview_rows), lambda: get_log_results(str_log, preview_rows))
+
+def get_log_results(str_log, preview_rows = stream_preview_rows):
+    '''
+    Parsing the event log and discovering its DFG (see get_shared_log): in memory or,
+    if the estimate is over memory_budget_mb, by the streaming discovery
+    '''
+    estimate = len(str_log) * memory_per_char
+    stream = estimate > memory_budget_mb * 2**20
+    if not stream: df_log = get_df_log(str_log)
+    else:   # only the first variants are kept for the tables
+        traces, qtys = next(get_log_chunks(str_log, preview_rows), ([], []))
+        df_log = pd.DataFrame({'trace': traces, 'qty': qtys})
+    if len(df_log) == 0: raise ValueError('Error! Check your input data')
+    df_log_IO = df_log.assign(trace = 'I' + df_log['trace'] + 'O')
+    df_variants_IO = df_log_IO.groupby('trace', as_index = False, sort = False)['qty'].sum().sort_values(by=['qty'], ascending=False)
+    if not stream:   # the variants are counted by the kernels
+        DFG_nodes, DFG_arcs = get_DFG_codes(list(df_variants_IO['trace']), list(df_variants_IO['qty']))
+        max_qty = int(df_variants_IO['qty'].max())   # highest variant frequency
+    else:
+        DFG_nodes, DFG_arcs = get_DFG_stream(get_log_chunks(str_log))
+        # highest variant frequency - of the merged variants as in the variant-based filtering
+        max_qty = max((max(qty_list) for traces_list, qty_list in
+                       get_variant_chunks(get_log_chunks(str_log), 1, get_spill_partitions(str_log))), default = 0)
+    memory_report = {'estimate': estimate, 'log': get_size((df_log, df_log_IO, df_variants_IO)), 'DFG': get_size((DFG_nodes, DFG_arcs))}
+    return {'df_log': df_log, 'df_log_IO': df_log_IO, 'df_variants_IO': df_variants_IO, 'stream': stream, 'DFG_nodes': DFG_nodes, 'DFG_arcs': DFG_arcs,
+            'max_qty': max_qty, 'memory': memory_report}
+
+def get_shared_trie(str_log):
+    '''
+    Prefix trie of the variants of the event log (see get_variant_trie) for the k-step relations,
+    built on the first use and kept in the memory store (see get_stored)
+    '''
+    df_variants_IO = get_shared_log(str_log)['df_variants_IO']
+    return get_stored(('trie', str_log), lambda: get_variant_trie(list(df_variants_IO['trace']), list(df_variants_IO['qty'])))
+
+def get_shared_activity_filtered(str_log, act):
+    '''
+    Projection of the event log on a subset of activities act (tuple with I & O) and its DFG
+    (kept in the memory store, see get_stored)
+
+    Returns
+    -------
+    abf_L : pandas.DataFrame
+        log with start & end (see get_shared_log) and the column 'trace_projection'
+    abf_DFG_nodes, abf_DFG_arcs : pandas.DataFrame
+        DFG of the projected log
+    '''
+    bundle = get_bundle(str_log, 'activity_filtered', act)
+    if bundle is not None: return bundle
+    shared_log = get_shared_log(str_log)
+    return get_stored(('act', str_log, act), lambda: get_activity_filtered(str_log, shared_log, act))
+
+def get_activity_filtered(str_log, shared_log, act):
+    '''
+    Projection of the event log on act and its DFG (see get_shared_activity_filtered),
+    shared_log - the parsed log (see get_log_results)
+    '''
+    df_log_IO = shared_log['df_log_IO']
+    if shared_log['stream']:
+        abf_L = df_log_IO.assign(trace_projection = [''.join(s for s in trace if s in act) for trace in df_log_IO['trace']])
+        return (abf_L,) + get_DFG_stream(get_log_chunks(str_log), act = act)
+    # projection of the variants and its DFG by the kernels
+    traces_list, qty_list = list(shared_log['df_variants_IO']['trace']), list(shared_log['df_variants_IO']['qty'])
+    projected_list = get_projected_variants(traces_list, act)
+    abf_L = df_log_IO.assign(trace_projection = df_log_IO['trace'].map(dict(zip(traces_list, projected_list))))
+    return (abf_L,) + get_DFG_codes(projected_list, qty_list)
+
+@st.cache_resource(max_entries = 256, show_spinner = False)
+def get_shared_variant_filtered(str_log, min_qty):
+    '''
+    DFG of the event log after the variant-based filtering with τ(var) = min_qty
+    '''
+    bundle = get_bundle(str_log, 'variant_filtered', min_qty)
+    if bundle is not None: return bundle
+    return get_variant_filtered(str_log, get_shared_log(str_log), min_qty)
+
+def get_variant_filtered(str_log, shared_log, min_qty):
+    '''
+    DFG of the event log after the variant-based filtering (see get_shared_variant_filtered),
+    shared_log - the parsed log (see get_log_results)
+    '''
+    if shared_log['stream']: return get_DFG_stream(get_log_chunks(str_log), min_qty = min_qty, partitions = get_spill_partitions(str_log))
+    df_variants_IO = shared_log['df_variants_IO']
+    DFG = (shared_log['DFG_nodes'], shared_log['DFG_arcs'])
+    return get_filter_pipeline(list(df_variants_IO['trace']), list(df_variants_IO['qty']), [('var', min_qty)], DFG)[:2]
+
+@st.cache_resource(max_entries = 128, show_spinner = False)
+def get_shared_vDFG(str_log, DFG_orientation, metric = 'qty'):
+    '''
+    Rendered DFG of the event log (see get_vDFG) shared between sessions
+    '''
+    bundle = get_bundle(str_log, 'vDFG', (DFG_orientation, metric))
+    if bundle is not None: return bundle
+    shared_log = get_shared_log(str_log)
+    return get_vDFG(shared_log['DFG_arcs'], shared_log['DFG_nodes'], DFG_orientation,'I','O', metric = metric)
+
+@st.cache_resource(max_entries = 256, show_spinner = False)
+def get_shared_filtered_vDFG(str_log, kind, tau, DFG_orientation, metric = 'qty'):
+    '''
+    Rendered DFG of the event log after one filter shared between sessions:
+    kind = 'act' - tau is the tuple of the kept activities with I & O (see get_shared_activity_filtered),
+    'var' - tau is τ(var) (see get_shared_variant_filtered), 'arc' - tau is τ(arc) for the metric
+    '''
+    bundle = get_bundle(str_log, 'filtered_vDFG', (kind, tau, DFG_orientation, metric))
+    if bundle is not None: return bundle
+    if kind == 'act': DFG_nodes, DFG_arcs = get_shared_activity_filtered(str_log, tau)[1:]
+    elif kind == 'var': DFG_nodes, DFG_arcs = get_shared_variant_filtered(str_log, tau)
+    else:
+        shared_log = get_shared_log(str_log)
+        DFG_nodes, DFG_arcs = shared_log['DFG_nodes'], shared_log['DFG_arcs'][shared_log['DFG_arcs'][metric] >= tau]
+    return get_vDFG(DFG_arcs, DFG_nodes, DFG_orientation,'I','O', metric = metric)
+
+@st.cache_resource(max_entries = 64, show_spinner = False)
+def get_shared_footprint_matrix(str_log, k = 1):
+    '''
+    DFG matrix and footprint of the event log (see get_footprint_matrix) shared between sessions.
+    k - relation between activities (see get_relations): 1 - directly-follows, None - eventually-follows
+    '''
+    bundle = get_bundle(str_log, 'footprint', k)
+    if bundle is not None: return bundle
+    shared_log = get_shared_log(str_log)
+    trie = get_shared_trie(str_log) if (k != 1) & is_relation_trie(str_log, shared_log) else None
+    return get_footprint_results(str_log, shared_log, k, trie)
+
+def is_relation_trie(str_log, shared_log):
+    '''
+    True if the k-step relations of the log are computed on the trie of its variants (see get_shared_trie),
+    False if the trie would exceed memory_budget_mb (see trie_memory_per_char) - chunk by chunk
+    '''
+    return (not shared_log['stream']) & (len(str_log) * trie_memory_per_char <= memory_budget_mb * 2**20)
+
+def get_footprint_results(str_log, shared_log, k = 1, trie = None):
+    '''
+    DFG matrix and footprint of the event log (see get_shared_footprint_matrix), shared_log - the parsed log
+    (see get_log_results), trie - the trie of its variants for the k-step relations (see is_relation_trie)
+    or None - the relations are computed chunk by chunk
+    '''
+    if k == 1: DFG_arcs = shared_log['DFG_arcs']
+    elif trie is None: DFG_arcs = get_relations_stream(get_log_chunks(str_log), k)
+    else: DFG_arcs = get_relations(trie, k)
+    return get_footprint_matrix(list(DFG_arcs['pair']),list(DFG_arcs['qty']),'I','O')
+
+@st.cache_resource(max_entries = 64, show_spinner = False)
+def get_shared_export(str_log, fmt = 'parquet'):
+    '''
+    Bulk export of the DFG of the event log (see save_DFG_export) as file contents {'nodes': bytes, ...}
+    '''
+    bundle = get_bundle(str_log, 'export', fmt)
+    if bundle is not None: return bundle
+    return get_export_results(get_shared_log(str_log), fmt)
+
+def get_export_results(shared_log, fmt = 'parquet'):
+    '''
+    Bulk export of the DFG of the parsed log (see get_shared_export, get_log_results)
+    '''
+    files = {key: io.BytesIO() for key in ['nodes', 'arcs', 'matrix', 'footprint']}
+    save_DFG_export(files, shared_log['DFG_nodes'], shared_log['DFG_arcs'], 'I', 'O', fmt)
+    return {key: f.getvalue() for key, f in files.items()}
+# =============================================================================
+# Table views: only the visible part of a large table is sent to the browser
+# =============================================================================
+def show_table(container, df, key, page_size = 100):
+    '''
+    Showing a table page by page with the server-side sorting and search.
+    Tables not longer than one page are shown as they are.
+
+    Parameters
+    ----------
+    container : streamlit container
+        st, a column or an expander where the table is shown
+    df : pandas.DataFrame
+        table to show
+    key : str
+        unique key of the table on the page (prefix for the widget keys)
+    page_size : int
+        number of rows sent to the browser
+
+    Example
+    -------
+    show_table(col2, DFG_arcs, 'p5_arcs_full')
+    '''
+    if len(df) <= page_size:
+        container.dataframe(df)
+        return
+    # search in all columns (as strings)
+    search = container.text_input('Search', value = '', key = key + '_search')
+    if search:
+        mask = pd.Series(False, index = df.index)
+        for col in df.columns: mask |= df[col].astype(str).str.contains(search, regex = False)
+        df = df[mask]
+    # sorting: 'column ↑' or 'column ↓'
+    sort_options = ['-'] + [col + ' ' + order for col in df.columns for order in ['↓','↑']]
+    sort_by = container.selectbox('Sort by', sort_options, index = 0, key = key + '_sort')
+    if sort_by != '-': df = df.sort_values(by = [sort_by[:-2]], ascending = sort_by.endswith('↑'))
+    # the only page sent to the browser
+    n_pages = max(1, (len(df) + page_size - 1) // page_size)
+    page = container.number_input('Page (of %d)' % (n_pages), min_value = 1, max_value = n_pages, 
+                                  value = 1, step = 1, key = key + '_page')
+    container.dataframe(df.iloc[(page - 1) * page_size : page * page_size])
+    container.caption('Rows %d-%d of %d' % (min(len(df), (page - 1) * page_size + 1), min(len(df), page * page_size), len(df)))
+
+def show_matrix(container, df, key, window = 12):
+    '''
+    Showing a square |A|×|A| table (DFG matrix, footprint) by windows of window×window cells.
+    Tables not larger than one window are shown as they are (|A| <= 28: a..z with I & O,
+    so the window is smaller than the largest matrix; the default logs fit in one window).
+    '''
+    if (len(df) <= window) & (len(df.columns) <= window):
+        container.dataframe(df)
+        return
+    first_row = container.number_input('First row (of %d)' % (len(df)), min_value = 1, max_value = len(df), 
+                                       value = 1, step = 1, key = key + '_row')
+    first_col = container.number_input('First column (of %d)' % (len(df.columns)), min_value = 1, max_value = len(df.columns), 
+                                       value = 1, step = 1, key = key + '_col')
+    container.dataframe(df.iloc[first_row - 1 : first_row - 1 + window, first_col - 1 : first_col - 1 + window])
+
 # =============================================================================
 # Exercise #1 - DFG (Baseline Discovery Algorithm)
 # =============================================================================
+def get_variant_trie(traces_list, qty_list):
+    '''
+    Building a weighted prefix trie of the event log variants.
+    Every trie node is a dict {'qty': int, 'end': int, 'next': dict}:
+    'qty' - number of cases passing through the node (prefix frequency),
+    'end' - number of cases ending in the node, 'next' - child nodes by activity.
+    Variants sharing a prefix share the trie nodes of this prefix.
+
+    Parameters
+    ----------
+    traces_list : list
+        list of traces (e.g. traces_list = ['IacdO','IbceO'])
+    qty_list : list
+        list of frequencies of traces (e.g. qty_list = [45,42] )
+    Returns
+    -------
+    trie : dict
+        root node of the trie (the root itself has no activity)
+    
+    Example
+    -------
+    trie = get_variant_trie(list(df_log['trace']), list(df_log['qty']))
+    '''
+    trie = {'qty': 0, 'end': 0, 'next': {}}
+    for trace, qty in zip(traces_list, qty_list):
+        node = trie
+        node['qty'] += qty
+        for s in trace:
+            node = node['next'].setdefault(s, {'qty': 0, 'end': 0, 'next': {}})
+            node['qty'] += qty
+        node['end'] += qty
+    return trie
+
+def get_DFG_trie(trie):
+    '''
+    Computing the DFG nodes and arcs with all their metrics from the trie in one pass (see get_DFG).
+    Every trie edge is an arc occurrence counted once with the aggregated frequency
+    of all variants sharing the prefix. The occurrences of activities and arcs on the
+    current prefix give the case frequency (first occurrence) and the repetitions in a case.
+    '''
+    nodes, arcs = dict(), dict()
+    on_path = dict()   # occurrences of activities and arcs in the current prefix
+    stack = [(None, s, child) for s, child in trie['next'].items()]
+    while stack:
+        a, s, node = stack.pop()
+        if node is None:   # leaving the node - remove it from the prefix
+            on_path[s] -= 1
+            if a is not None: on_path[a + s] -= 1
+            continue
+        w = node['qty']
+        for key, metrics in ([(s, nodes)] if a is None else [(s, nodes), (a + s, arcs)]):
+            n = on_path[key] = on_path.get(key, 0) + 1
+            m = metrics.setdefault(key, [0] * len(node_metrics if metrics is nodes else arc_metrics))
+            m[0] += w                   # qty
+            if n == 1: m[1] += w        # case_qty
+            if n > m[2]: m[2] = n       # max_rep
+        # start_qty & end_qty - activities directly after the start (I) and before the end (O)
+        if ((a is None) & (s != 'I')) | (a == 'I'): nodes[s][3] += w
+        if (s == 'O') & (a is not None): nodes[a][4] += w
+        elif (node['end'] > 0) & (s != 'O'): nodes[s][4] += node['end']
+        stack.append((a, s, None))
+        stack.extend((s, c, child) for c, child in node['next'].items())
+    return get_DFG_frames(nodes, arcs)
+
+def get_DFG_frames(nodes, arcs):
+    '''
+    DFG nodes & arcs from dicts {activity: [metrics]} and {arc: [metrics]} (see node_metrics, arc_metrics)
+    as pandas.DataFrame (see get_DFG), sorted in descending frequency (ties in alphabetical order)
+    '''
+    DFG_nodes_agg = pd.DataFrame(list(nodes.values()), columns = node_metrics, index = pd.Index(list(nodes), name = 'act'), dtype = 'int64').sort_index()
+    DFG_arcs_agg = pd.DataFrame(list(arcs.values()), columns = arc_metrics, index = pd.Index(list(arcs), name = 'pair'), dtype = 'int64').sort_index()
+    DFG_nodes_agg = DFG_nodes_agg.sort_values(by=['qty'], ascending=False).reset_index()
+    DFG_arcs_agg = DFG_arcs_agg.sort_values(by=['qty'], ascending=False).reset_index()
+    return DFG_nodes_agg, DFG_arcs_agg
+
+# =============================================================================
+# Streaming discovery: bounded memory for the logs exceeding the memory budget
+# =============================================================================
+def get_log_chunks(str_log, chunk_size = 10000):
+    '''
+    Reading the event log string ('[<acd>45, <bce>42]') by chunks of traces without
+    parsing it as a whole (same tokens as get_df_log).
+
+    Returns
+    -------
+    generator of pairs (traces_list, qty_list), not longer than chunk_size each
+    '''
+    traces_list, qty_list = [], []
+    for m in re.finditer('[a-z]+|[0-9]+', str_log):
+        token = m.group()
+        if token[0].isdigit(): qty_list.append(int(token))
+        else: traces_list.append(token)
+        if (len(traces_list) >= chunk_size) & (len(qty_list) >= chunk_size):
+            yield traces_list[:chunk_size], qty_list[:chunk_size]
+            del traces_list[:chunk_size], qty_list[:chunk_size]
+    if len(traces_list) != len(qty_list): raise ValueError('Error! Check your input data')
+    if traces_list: yield traces_list, qty_list
+
+def get_DFG_stream(log_chunks, act = None, min_qty = 0, partitions = 1):
+    '''
+    Computing the DFG nodes & arcs (see get_DFG) chunk by chunk: only the counters of
+    nodes and arcs are kept in memory. Start (I) & end (O) are added to each trace.
+
+    Parameters
+    ----------
+    log_chunks : iterable
+        pairs (traces_list, qty_list), e.g. get_log_chunks(str_log)
+    act : tuple
+        if given - the traces are projected on these activities (activity-based filtering)
+    min_qty : int
+        variants with frequency < min_qty are skipped (variant-based filtering, the frequency
+        of a variant is the total frequency of its equal traces as in get_filter_pipeline)
+    partitions : int
+        spill partitions of the variant merge for min_qty > 0 (see get_variant_chunks)
+    '''
+    if min_qty > 0: log_chunks = get_variant_chunks(log_chunks, min_qty, partitions)
+    # counters of all codes (see counting kernels), the chunks are counted by the kernels
+    nodes = np.zeros((n_codes, len(node_metrics)), dtype = np.int64)
+    arcs = np.zeros((n_codes * n_codes, len(arc_metrics)), dtype = np.int64)
+    keep = None if act is None else get_codes_mask(act)
+    for traces_list, qty_list in log_chunks:
+        traces_list = ['I' + trace + 'O' for trace, qty in zip(traces_list, qty_list) if qty >= min_qty]
+        qty_list = [qty for qty in qty_list if qty >= min_qty]
+        for total, chunk in zip((nodes, arcs), get_codes_counts(traces_list, qty_list, keep)):
+            total[:, 2] = np.maximum(total[:, 2], chunk[:, 2])   # max_rep
+            chunk[:, 2] = 0
+            total += chunk
+    return get_DFG_frames(*get_decoded_counts(nodes, arcs))
+
+def get_spill_partitions(str_log):
+    '''
+    Number of the spill partitions of the variant merge (see get_variant_chunks): the part of the log
+    in one partition is estimated to fit in memory_budget_mb (see memory_per_char), at most max_spill_partitions
+    '''
+    budget = max(1, memory_budget_mb * 2**20)
+    return int(min(max_spill_partitions, max(1, -(-len(str_log) * memory_per_char // budget))))
+
+def get_variant_chunks(log_chunks, min_qty, partitions = 1, chunk_size = 10000):
+    '''
+    Variants of the log with frequency >= min_qty by chunks (see get_log_chunks). Equal traces of all chunks
+    are merged in bounded memory: the traces are written to temporary files by their hash (equal traces
+    go to the same partition), then the partitions are merged one by one, so only the distinct variants
+    of one partition are kept in memory
+    '''
+    files = [tempfile.TemporaryFile('w+', encoding = 'ascii') for i in range(partitions)]
+    try:
+        for traces_list, qty_list in log_chunks:
+            for trace, qty in zip(traces_list, qty_list): files[hash(trace) % partitions].write('%s %d\n' % (trace, qty))
+        for f in files:
+            f.seek(0)
+            variants = dict()
+            for line in f:
+                trace, qty = line.split()
+                variants[trace] = variants.get(trace, 0) + int(qty)
+            variants = [(trace, qty) for trace, qty in variants.items() if qty >= min_qty]
+            for start in range(0, len(variants), chunk_size):
+                chunk = variants[start:start + chunk_size]
+                yield [trace for trace, qty in chunk], [qty for trace, qty in chunk]
+    finally:
+        for f in files: f.close()
+
+# =============================================================================
+# Counting kernels over integer-encoded traces (the code of an activity is its ASCII code).
+# With Numba installed the loop kernels are compiled, otherwise the NumPy kernels are used;
+# both give identical results. DFG_KERNELS=numpy forces the NumPy kernels.
+# =============================================================================
+n_codes = 128
+start_code, end_code = ord('I'), ord('O')   # codes of start & end
+kernel_backend = 'numba' if (numba is not None) & (os.environ.get('DFG_KERNELS', '') != 'numpy') else 'numpy'
+
+def get_encoded_log(traces_list, qty_list):
+    '''
+    Encoding the traces as one array of codes
+
+    Returns
+    -------
+    codes : numpy.ndarray
+        codes of all events of all traces one after another
+    offsets : numpy.ndarray
+        trace t is codes[offsets[t]:offsets[t+1]]
+    qty : numpy.ndarray
+        frequencies of the traces
+    '''
+    codes = np.frombuffer(''.join(traces_list).encode('ascii'), dtype = np.uint8).astype(np.int64)
+    offsets = np.zeros(len(traces_list) + 1, dtype = np.int64)
+    offsets[1:] = np.cumsum(np.fromiter(map(len, traces_list), dtype = np.int64, count = len(traces_list)))
+    return codes, offsets, np.array(qty_list, dtype = np.int64)
+
+def get_codes_mask(act):
+    '''
+    Mask of codes of the activities act (start & end are always kept)
+    '''
+    keep = np.zeros(n_codes, dtype = np.bool_)
+    keep[[ord(s) for s in set(act) | {'I', 'O'}]] = True
+    return keep
+
+def get_codes_counts(traces_list, qty_list, keep = None):
+    '''
+    Kernel counters of the traces (see count_codes), projected on the codes with keep[code] = True if given
+    '''
+    codes, offsets, qty = get_encoded_log(traces_list, qty_list)
+    if keep is not None: codes, offsets = project_codes(codes, offsets, keep)
+    return count_codes(codes, offsets, qty, n_codes)
+
+def get_DFG_codes(traces_list, qty_list, act = None):
+    '''
+    DFG nodes & arcs (see get_DFG) of the traces with start & end counted by the kernels,
+    projected on the activities act (with start & end) if given
+    '''
+    nodes, arcs = get_codes_counts(traces_list, qty_list, None if act is None else get_codes_mask(act))
+    return get_DFG_frames(*get_decoded_counts(nodes, arcs))
+
+def get_projected_variants(traces_list, act):
+    '''
+    Projection of the traces on the activities act (with start & end) by the kernels (see project_codes)
+
+    Returns
+    -------
+    projected_list : list
+        projected traces in the order of traces_list (i.e. 'IacdO' can be projected to 'IacO')
+    '''
+    codes, offsets, qty = get_encoded_log(traces_list, [])
+    codes, offsets = project_codes(codes, offsets, get_codes_mask(act))
+    projected = codes.astype(np.uint8).tobytes().decode('ascii')
+    return [projected[offsets[t]:offsets[t + 1]] for t in range(len(traces_list))]
+
+def get_variants(traces_list, qty_list):
+    '''
+    Variants of the traces: equal traces merged with their total frequency (in the order of the first occurrence)
+
+    Returns
+    -------
+    variants_list, variants_qty_list : list
+    '''
+    variants = dict()
+    for trace, qty in zip(traces_list, qty_list): variants[trace] = variants.get(trace, 0) + qty
+    return list(variants), list(variants.values())
+
+def get_decoded_counts(nodes, arcs):
+    '''
+    Kernel counters (see count_codes) as dicts {activity: [metrics]} and {arc: [metrics]}
+    '''
+    nodes_dict = {chr(c): [int(x) for x in nodes[c]] for c in np.nonzero(nodes[:, 2])[0]}
+    arcs_dict = {chr(p // n_codes) + chr(p % n_codes): [int(x) for x in arcs[p]] for p in np.nonzero(arcs[:, 2])[0]}
+    return nodes_dict, arcs_dict
+
+def count_codes_loops(codes, offsets, qty, n_codes):
+    '''
+    Counting the metrics of nodes & arcs (see node_metrics, arc_metrics) of the encoded traces
+    with start & end: nodes[code] and arcs[code_1 * n_codes + code_2] (loops - compiled by Numba)
+    '''
+    nodes = np.zeros((n_codes, 5), dtype = np.int64)
+    arcs = np.zeros((n_codes * n_codes, 3), dtype = np.int64)
+    node_seen = np.zeros(n_codes, dtype = np.int64)
+    arc_seen = np.zeros(n_codes * n_codes, dtype = np.int64)
+    for t in range(len(offsets) - 1):
+        start, end, w = offsets[t], offsets[t + 1], qty[t]
+        # occurrences in the trace
+        for i in range(start, end):
+            node_seen[codes[i]] += 1
+            if i + 1 < end: arc_seen[codes[i] * n_codes + codes[i + 1]] += 1
+        # add to the metrics, clear the occurrences
+        for i in range(start, end):
+            c = codes[i]
+            n = node_seen[c]
+            if n > 0:
+                nodes[c, 0] += n * w
+                nodes[c, 1] += w
+                nodes[c, 2] = max(nodes[c, 2], n)
+                node_seen[c] = 0
+            if i + 1 < end:
+                p = c * n_codes + codes[i + 1]
+                n = arc_seen[p]
+                if n > 0:
+                    arcs[p, 0] += n * w
+                    arcs[p, 1] += w
+                    arcs[p, 2] = max(arcs[p, 2], n)
+                    arc_seen[p] = 0
+        # start_qty & end_qty - as in get_DFG_trie: activities directly after the start (I) and before
+        # the end (O), the first and the last activity of a trace without start or end
+        if end > start:
+            if codes[start] != start_code: nodes[codes[start], 3] += w
+            if codes[end - 1] != end_code: nodes[codes[end - 1], 4] += w
+        for i in range(start, end - 1):
+            if codes[i] == start_code: nodes[codes[i + 1], 3] += w
+            if codes[i + 1] == end_code: nodes[codes[i], 4] += w
+    return nodes, arcs
+
+def count_codes_numpy(codes, offsets, qty, n_codes):
+    '''
+    Same as count_codes_loops with NumPy: occurrences are counted by np.unique of (trace, code) keys
+    '''
+    nodes = np.zeros((n_codes, 5), dtype = np.int64)
+    arcs = np.zeros((n_codes * n_codes, 3), dtype = np.int64)
+    lengths = np.diff(offsets)
+    trace_id = np.repeat(np.arange(len(lengths), dtype = np.int64), lengths)
+    is_arc = np.ones(len(codes), dtype = np.bool_)   # event followed by an event of the same trace
+    is_arc[offsets[1:][lengths > 0] - 1] = False
+    arc_start = np.nonzero(is_arc)[0]
+    for metrics, trace_keys, keys, n_keys in ((nodes, trace_id, codes, n_codes),
+                                              (arcs, trace_id[arc_start], codes[arc_start] * n_codes + codes[arc_start + 1], n_codes * n_codes)):
+        # occurrences n of every key in every trace
+        keys_unique, n = np.unique(trace_keys * n_keys + keys, return_counts = True)
+        t, key = keys_unique // n_keys, keys_unique % n_keys
+        np.add.at(metrics[:, 0], key, n * qty[t])
+        np.add.at(metrics[:, 1], key, qty[t])
+        np.maximum.at(metrics[:, 2], key, n)
+    # start_qty & end_qty (see count_codes_loops)
+    first, last, w = offsets[:-1][lengths > 0], offsets[1:][lengths > 0] - 1, qty[lengths > 0]
+    np.add.at(nodes[:, 3], codes[first][codes[first] != start_code], w[codes[first] != start_code])
+    np.add.at(nodes[:, 4], codes[last][codes[last] != end_code], w[codes[last] != end_code])
+    after_start = arc_start[codes[arc_start] == start_code]
+    np.add.at(nodes[:, 3], codes[after_start + 1], qty[trace_id[after_start]])
+    before_end = arc_start[codes[arc_start + 1] == end_code]
+    np.add.at(nodes[:, 4], codes[before_end], qty[trace_id[before_end]])
+    return nodes, arcs
+
+def project_codes_loops(codes, offsets, keep):
+    '''
+    Projection of the encoded traces on the codes with keep[code] = True (loops - compiled by Numba)
+    '''
+    projected = np.empty_like(codes)
+    projected_offsets = np.zeros_like(offsets)
+    j = 0
+    for t in range(len(offsets) - 1):
+        for i in range(offsets[t], offsets[t + 1]):
+            if keep[codes[i]]:
+                projected[j] = codes[i]
+                j += 1
+        projected_offsets[t + 1] = j
+    return projected[:j], projected_offsets
+
+def project_codes_numpy(codes, offsets, keep):
+    '''
+    Same as project_codes_loops with NumPy
+    '''
+    mask = keep[codes]
+    kept = np.zeros(len(codes) + 1, dtype = np.int64)
+    kept[1:] = np.cumsum(mask)
+    return codes[mask], kept[offsets]
+
+@st.cache_resource(show_spinner = False)
+def get_kernels(backend):
+    '''
+    Counting kernels of the backend (count_codes, project_codes), compiled once per process:
+    Streamlit executes the script at every rerun and Numba cannot cache the compiled code on disk
+    for a script that is not an importable module
+    '''
+    if backend == 'numba': return numba.njit(count_codes_loops), numba.njit(project_codes_loops)
+    return count_codes_numpy, project_codes_numpy
+
+count_codes, project_codes = get_kernels(kernel_backend)
+
+def check_kernels():
+    '''
+    Parity check of the counting kernels: the DFGs of a small log (traces with and without start & end,
+    repetitions, projections) by the kernels of the backend, by the NumPy kernels and by the trie walk
+    (see get_DFG_trie) must be equal. Raises RuntimeError otherwise (e.g. python dfg_precompute.py).
+    '''
+    traces_list, qty_list = ['IabcbO','IacO','IabcbO','abcb','Ia','IO','cO'], [3,2,1,4,1,2,5]
+    for act in [None, ('I','a','b','O'), ('I','c','O')]:
+        keep = None if act is None else get_codes_mask(act)
+        codes, offsets, qty = get_encoded_log(traces_list, qty_list)
+        if keep is not None: projected = project_codes_numpy(codes, offsets, keep)
+        else: projected = (codes, offsets)
+        projected_traces = traces_list if act is None else get_projected_variants(traces_list, act)
+        DFGs = {'kernels (%s)' % (kernel_backend): get_DFG_codes(traces_list, qty_list, act),
+                'kernels (numpy)': get_DFG_frames(*get_decoded_counts(*count_codes_numpy(*projected, qty, n_codes))),
+                'trie': get_DFG_trie(get_variant_trie(projected_traces, qty_list))}
+        reference = DFGs.pop('trie')
+        for name, DFG in DFGs.items():
+            if not (DFG[0].equals(reference[0]) & DFG[1].equals(reference[1])):
+                raise RuntimeError('The DFG by the %s differs from the trie walk (activities %s)' % (name, act))
+
+# metrics of the DFG nodes & arcs (columns of DFG_nodes & DFG_arcs after 'act' / 'pair'):
+# qty - frequency, case_qty - number of cases containing the node/arc, max_rep - the highest
+# number of repetitions in one case, start_qty/end_qty - number of cases starting/ending with the activity
+node_metrics = ['qty','case_qty','max_rep','start_qty','end_qty']
+arc_metrics = ['qty','case_qty','max_rep']
+arc_metric_names = {'qty': 'frequency', 'case_qty': 'case frequency', 'max_rep': 'max repetitions in a case'}
+
 def get_DFG (traces_list, qty_list):
     '''
     Computing the DFG nodes - (activity, frequency), and
     the DFG arcs - ((activity,activity), frequency)
+    with the other metrics of nodes & arcs in the same pass (see node_metrics, arc_metrics)
 
     Parameters
     ----------
@@ -413,38 +1191,20 @@ def get_DFG (traces_list, qty_list):
     Returns
     -------
     DFG_nodes_agg : pandas.DataFrame
-        2 columns: 'act' - activities, 'qty' - their frequencies in the event log
+        columns: 'act' - activities, 'qty' - their frequencies in the event log,
+        'case_qty', 'max_rep', 'start_qty', 'end_qty' - other metrics
     DFG_arcs_agg : pandas.DataFrame
-        2 columns: 'pair' - arcs, 'qty' - their frequencies in the event log
+        columns: 'pair' - arcs, 'qty' - their frequencies in the event log,
+        'case_qty', 'max_rep' - other metrics
     
     Example
     -------
     DFG_nodes, DFG_arcs = get_DFG (list(df_log['trace']), list(df_log['qty']))
     '''   
-    # create internal pd.DataFrame based on input data
-    L = pd.DataFrame({'trace_full':traces_list, 'qty': qty_list})
-    # =============================================================================
-    # NODES (ACTIVITIES)
-    # function get_activities returns pd with pairs (activity, frequency) for one trace ('abc') with frequency (20)
-    get_activities = lambda trace, qty: pd.DataFrame({'act':list(trace),'qty':qty})
-    # compute DFG nodes as pd for all traces using the function get_activities
-    L['nodes'] = list(map(lambda trace, qty: get_activities(trace, qty), L['trace_full'], L['qty']))
-    # merge and aggregate all DFG nodes with sorting in descending frequency
-    DFG_nodes = pd.concat([L.iloc[i]['nodes'] for i in list(L.index)])
-    DFG_nodes_agg = pd.DataFrame(DFG_nodes.groupby(['act']).sum()).sort_values(by=['qty'], ascending=False).reset_index()
-    # =============================================================================
-    # EDGES (ARCS)
-    # function get_pairs returns pd with pairs (arc, frequency) for one trace ('abc') with frequency (20)
-    get_pairs = lambda trace, qty: pd.DataFrame({'pair':list(map(lambda s1, s2: s1 + s2, trace[:-1], trace[1:])),'qty':qty})
-    # compute DFG edges (arcs) as pd for all traces using the function get_pairs
-    L['arcs'] = list(map(lambda trace, qty: get_pairs(trace, qty), L['trace_full'], L['qty']))
-    # merge and aggregate all DFG nodes with sorting in descending frequency
-    DFG_arcs = pd.concat([L.iloc[i]['arcs'] for i in list(L.index)])
-    DFG_arcs_agg = pd.DataFrame(DFG_arcs.groupby(['pair']).sum()).sort_values(by=['qty'], ascending=False).reset_index()
-    
-    return DFG_nodes_agg, DFG_arcs_agg
+    # all traces are counted at once by the kernels (see get_DFG_codes)
+    return get_DFG_codes(traces_list, qty_list)
 
-def get_vDFG(DFG_arcs, DFG_nodes, DFG_orientation,S,E):
+def get_vDFG(DFG_arcs, DFG_nodes, DFG_orientation,S,E,fmt = 'png',metric = 'qty'):
     '''
     Creating the DFG by Graphviz 
 
@@ -460,6 +1220,10 @@ def get_vDFG(DFG_arcs, DFG_nodes, DFG_orientation,S,E):
         symbol for the artificial activity 'Start'- 'I'
     E : str
         symbol for the artificial activity 'End'- 'O'
+    fmt : str
+        output format of Graphviz - 'png' (default) or 'svg'
+    metric : str
+        column of DFG_arcs shown as arc labels - 'qty' (default), 'case_qty' or 'max_rep'
 
     Returns
     -------
@@ -472,7 +1236,7 @@ def get_vDFG(DFG_arcs, DFG_nodes, DFG_orientation,S,E):
     # init graph
     vDFG = graphviz.Digraph('finite_state_machine')
     vDFG.attr(rankdir = DFG_orientation, size = '1000,1000') 
-    vDFG.format = 'png'
+    vDFG.format = fmt
     # DFG NODES 
     for i in DFG_nodes.index:
         # start or end - double circles
@@ -484,12 +1248,77 @@ def get_vDFG(DFG_arcs, DFG_nodes, DFG_orientation,S,E):
             vDFG.node(DFG_nodes['act'].loc[i], label = DFG_nodes['act'].loc[i])
     # DFG EDGES 
     for j in DFG_arcs.index:
-        vDFG.edge(DFG_arcs['pair'].loc[j][0], DFG_arcs['pair'].loc[j][1], label = str(DFG_arcs['qty'].loc[j]))
+        vDFG.edge(DFG_arcs['pair'].loc[j][0], DFG_arcs['pair'].loc[j][1], label = str(DFG_arcs[metric].loc[j]))
     return vDFG.pipe()
 
 # =============================================================================
 # Exercise #2 - DFG matrix & footprint
 # =============================================================================
+# k-step and eventually-follows relations (arcs of the same shape as DFG_arcs)
+def get_relation_counts(trie, k, arcs):
+    '''
+    Counting the pairs (a,b) where b follows a within k steps (k = None - anywhere later)
+    in the trie, the counts are added to arcs {pair: [qty, case_qty, max_rep]}.
+    The window of the last k activities (or the activity counts of the whole prefix)
+    is kept for the current prefix, so each trie node costs O(k) (or O(|A|)).
+    '''
+    path, path_counts = [], dict()   # current prefix and its activity counts (k = None)
+    on_path = dict()                 # occurrences of pairs in the current prefix
+    stack = [(s, child) for s, child in trie['next'].items()]
+    while stack:
+        s, node = stack.pop()
+        if node is None:   # leaving the node - remove it from the prefix
+            for pair, c in s: on_path[pair] -= c
+            a = path.pop()
+            path_counts[a] -= 1
+            continue
+        w = node['qty']
+        if k is None: window = path_counts
+        else:
+            window = dict()
+            for a in path[-k:]: window[a] = window.get(a, 0) + 1
+        added = []
+        for a, c in window.items():
+            if c == 0: continue
+            pair = a + s
+            n = on_path[pair] = on_path.get(pair, 0) + c
+            m = arcs.setdefault(pair, [0] * len(arc_metrics))
+            m[0] += c * w                # qty
+            if n == c: m[1] += w         # case_qty - first occurrence in the prefix
+            if n > m[2]: m[2] = n        # max_rep
+            added.append((pair, c))
+        path.append(s)
+        path_counts[s] = path_counts.get(s, 0) + 1
+        stack.append((added, None))
+        stack.extend((c, child) for c, child in node['next'].items())
+    return arcs
+
+def get_relations(trie, k = None):
+    '''
+    Computing the k-step relation (b follows a within k steps) or the eventually-follows
+    relation (k = None) of the log with its frequencies, weighted by the variant frequencies.
+    k = 1 gives the DFG arcs.
+
+    Returns
+    -------
+    relation_arcs : pandas.DataFrame
+        same columns as DFG_arcs (see get_DFG): 'pair', 'qty', 'case_qty', 'max_rep'
+
+    Example
+    -------
+    ef_arcs = get_relations(get_shared_trie(str_log))
+    '''
+    return get_DFG_frames(dict(), get_relation_counts(trie, k, dict()))[1]
+
+def get_relations_stream(log_chunks, k = None):
+    '''
+    Same as get_relations, computed chunk by chunk of the log (see get_log_chunks)
+    '''
+    arcs = dict()
+    for traces_list, qty_list in log_chunks:
+        get_relation_counts(get_variant_trie(['I' + trace + 'O' for trace in traces_list], qty_list), k, arcs)
+    return get_DFG_frames(dict(), arcs)[1]
+
 # in_pairs = ['Sa','eE',...], S = "S", E = "E" or ("X","Y") or ("I","O"), in_qty_list = [10,20,...]
 def get_footprint_matrix(in_pairs,in_qty_list,S,E):
     '''
@@ -520,35 +1349,258 @@ def get_footprint_matrix(in_pairs,in_qty_list,S,E):
         matrix as a dictionary (i.e. dict_dfg_matrix['ab'] can returns the number 23)
 
     '''
-    # function to get relation between activities in pair
-    get_rel = lambda pair,pairs: "||" if (''.join(list(pair)[::-1])) in pairs else "→"
-    # get relation and qty lists
-    rel = list(map(lambda ss: get_rel(ss, in_pairs), in_pairs))
-    # get reverse pairs/relations
-    in_pairs_reverse = list(map(lambda ss: ''.join(list(ss)[::-1]), in_pairs))
-    rel_reverse = list(map(lambda ss: "||" if (ss == "||") else "←", rel))
-    # get full df with index = pairs & rel - relation plus transform it to dict
-    arcs_full = pd.DataFrame({'rel':rel+rel_reverse}, index = in_pairs+in_pairs_reverse)
-    arcs_dict = arcs_full['rel'].to_dict()
-    # get dict pair - qty 
-    pair_qty_dict = pd.DataFrame({'qty':in_qty_list}, index = in_pairs)['qty'].to_dict()
-    # get sorted activity list
-    act_nodes = list(set(list(''.join(in_pairs).replace(S,'').replace(E,'')))) # without S, E
-    act_sorted = [S]+sorted(act_nodes)+[E]
+    # sorted activity list, matrix and footprint codes as arrays (see get_sparse_matrix, get_footprint_codes) - no loops over cells
+    act_sorted, rows, cols, qty = get_sparse_matrix(in_pairs,in_qty_list,S,E)
+    dfg_matrix = np.zeros((len(act_sorted), len(act_sorted)), dtype = np.int64)
+    dfg_matrix[rows, cols] = qty
+    footprint = np.array(footprint_symbols, dtype = object)[get_footprint_codes([in_pairs], act_sorted)[0]]
     # get the result df
-    df_footprint = pd.DataFrame(index = act_sorted)
-    df_dfg_matrix = pd.DataFrame(index = act_sorted)
-    for col in act_sorted:
-        df_footprint[col] = list(map(lambda ss: 
-                                     arcs_dict[ss+col] if (ss+col) in list(arcs_full.index) else '#', act_sorted))
-        df_dfg_matrix[col] = list(map(lambda ss: pair_qty_dict[ss+col] if (ss+col) in in_pairs else 0, act_sorted))
+    df_footprint = pd.DataFrame(footprint, index = act_sorted, columns = act_sorted)
+    df_dfg_matrix = pd.DataFrame(dfg_matrix, index = act_sorted, columns = act_sorted)
     # get footprint dict
-    all_arcs = [''.join(list(s)) for s in list(itertools.product(act_sorted,act_sorted))]
-    other_arcs = list(set(all_arcs) - set(arcs_full.index))   # dict with ''#''
-    dict_footprint = {ss: '#' for ss in other_arcs} | arcs_dict  # merge two dicts
-    dict_dfg_matrix = {ss: 0 for ss in other_arcs} | pair_qty_dict  # merge two dicts
+    all_arcs = [a + b for a, b in itertools.product(act_sorted,act_sorted)]
+    dict_footprint = dict(zip(all_arcs, footprint.ravel().tolist()))
+    dict_dfg_matrix = dict(zip(all_arcs, dfg_matrix.ravel().tolist()))
     return df_footprint, dict_footprint, df_dfg_matrix, dict_dfg_matrix
 
+# =============================================================================
+# Filter pipeline: activity-, variant- and arc-based filters in one call
+# =============================================================================
+def get_filter_plan(filters):
+    '''
+    Execution order of the filters (see get_filter_pipeline):
+    - consecutive filters of the same type are merged into one with the highest threshold
+      (projection keeps the frequencies of the remaining activities, variant filtering keeps
+      the frequencies of the remaining variants);
+    - arc-based filters do not change the log, they are merged and applied to the final DFG;
+    - activity- and variant-based filters do not commute, their order is kept.
+    '''
+    plan, tau_arc = [], None
+    for kind, tau in filters:
+        if kind not in ('act', 'var', 'arc'): raise ValueError('Unknown filter %s (expected act, var or arc)' % (kind))
+        if kind == 'arc': tau_arc = tau if tau_arc is None else max(tau_arc, tau)
+        elif plan and plan[-1][0] == kind: plan[-1] = (kind, max(plan[-1][1], tau))
+        else: plan.append((kind, tau))
+    if tau_arc is not None: plan.append(('arc', tau_arc))
+    return plan
+
+def get_filter_pipeline(traces_list, qty_list, filters, DFG = None, metric = 'qty'):
+    '''
+    Applying a chain of filters to the event log and computing the filtered DFG by the counting kernels.
+    Each step works on the variants of the previous step (projected variants are merged again),
+    the DFG of an intermediate log is computed only when the next step needs the activity frequencies.
+
+    Parameters
+    ----------
+    traces_list : list
+        variants of the log with start & end symbols (e.g. traces_list = ['IacdO','IbceO'])
+    qty_list : list
+        frequencies of the variants (e.g. qty_list = [45,42])
+    filters : list
+        filters as pairs (type, threshold), type is 'act' - τ(act), 'var' - τ(var) or 'arc' - τ(arc),
+        e.g. filters = [('var', 10), ('act', 30), ('arc', 5)]
+    DFG : tuple
+        (DFG_nodes, DFG_arcs) of the log if already computed (e.g. from the shared log store)
+    metric : str
+        column of DFG_arcs compared with τ(arc) - 'qty' (default), 'case_qty' or 'max_rep'
+        (as on the page Arc-Based Filtering)
+    Returns
+    -------
+    DFG_nodes : pandas.DataFrame
+        nodes of the filtered DFG
+    DFG_arcs : pandas.DataFrame
+        arcs of the filtered DFG
+    plan : list
+        executed filters (see get_filter_plan); filters that do not change the log are skipped
+
+    Example
+    -------
+    DFG_nodes, DFG_arcs, plan = get_filter_pipeline(list(df_variants_IO['trace']), list(df_variants_IO['qty']), [('act', 30), ('arc', 5)])
+    '''
+    plan = []
+    for kind, tau in get_filter_plan(filters):
+        if kind == 'act':
+            if DFG is None: DFG = get_DFG_codes(traces_list, qty_list)
+            DFG_nodes = DFG[0]
+            if (DFG_nodes['qty'] >= tau).all(): continue   # all activities are kept
+            act = list(DFG_nodes['act'][(DFG_nodes['qty'] >= tau)|(DFG_nodes['act'].isin(['I','O']))])
+            traces_list, qty_list = get_variants(get_projected_variants(traces_list, act), qty_list)
+            DFG = None
+        elif kind == 'var':
+            if tau <= 0: continue   # all variants are kept
+            traces_list, qty_list = [trace for trace, qty in zip(traces_list, qty_list) if qty >= tau], [qty for qty in qty_list if qty >= tau]
+            DFG = None
+        else:
+            if DFG is None: DFG = get_DFG_codes(traces_list, qty_list)
+            DFG = (DFG[0], DFG[1][DFG[1][metric] >= tau])
+        plan.append((kind, tau))
+    if DFG is None: DFG = get_DFG_codes(traces_list, qty_list)
+    return DFG[0], DFG[1], plan
+
+# =============================================================================
+# Footprint conformance: footprints as small-int matrices compared in batches
+# =============================================================================
+# relation codes: code(a,b) = [ab is an arc] + 2*[ba is an arc], footprint_symbols[code] - the relation
+footprint_symbols = ['#', '→', '←', '||']
+
+def get_footprint_codes(pairs_list, act_sorted):
+    '''
+    Encoding the footprints of several logs as one int8 array (logs × activities × activities)
+
+    Parameters
+    ----------
+    pairs_list : list
+        list of the arc lists of the logs (e.g. pairs_list = [['Ia','ab','bO'], ['Ib','bO']])
+    act_sorted : list
+        activities (rows and columns of the footprints), e.g. ['I','a','b','O']
+    Returns
+    -------
+    codes : numpy.ndarray
+        codes[n,i,j] - relation between act_sorted[i] and act_sorted[j] in log n (see footprint_symbols)
+    '''
+    act_index = {a: i for i, a in enumerate(act_sorted)}
+    arcs = np.zeros((len(pairs_list), len(act_sorted), len(act_sorted)), dtype = np.int8)
+    for n, in_pairs in enumerate(pairs_list):
+        rows = [act_index[pair[0]] for pair in in_pairs]
+        cols = [act_index[pair[1]] for pair in in_pairs]
+        arcs[n, rows, cols] = 1
+    return arcs + 2 * arcs.transpose(0, 2, 1)
+
+def get_footprint_conformance(ref_pairs, pairs_list, S, E):
+    '''
+    Footprint conformance of many logs against the reference footprint.
+    All footprints are built over the same set of activities (the union of all logs),
+    the cells are compared at once for all logs.
+
+    Parameters
+    ----------
+    ref_pairs : list
+        arcs of the reference DFG (e.g. ref_pairs = ['Ia','ab','bO'])
+    pairs_list : list
+        list of the arc lists of the compared logs
+    S : str
+        Start symbol (e.g. S = 'I')
+    E : str
+        End symbol (e.g. E = 'O')
+    Returns
+    -------
+    df_conformance : pandas.DataFrame
+        3 columns: 'log' - log number in pairs_list, 'fitness' - fraction of the footprint cells
+        equal to the reference, 'mismatches' - number of the different cells on and above the diagonal
+        (a mismatch and its mirror cell are counted once, as in df_mismatches)
+    df_mismatches : pandas.DataFrame
+        4 columns: 'log', 'pair', 'rel_ref' - relation in the reference, 'rel_log' - relation in the log;
+        every mismatch is listed once (cell 'ab', not its mirror 'ba')
+    
+    Example
+    -------
+    df_conformance, df_mismatches = get_footprint_conformance(list(DFG_arcs['pair']), [list(sub_DFG_arcs['pair'])], 'I', 'O')
+    '''
+    act_nodes = set(''.join(ref_pairs)) | set(''.join(''.join(in_pairs) for in_pairs in pairs_list))
+    act_sorted = [S]+sorted(act_nodes - {S, E})+[E]
+    ref_codes = get_footprint_codes([ref_pairs], act_sorted)[0]
+    codes = get_footprint_codes(pairs_list, act_sorted)
+    agree = (codes == ref_codes[np.newaxis])
+    # mismatching cells on and above the diagonal (the footprint is symmetric)
+    mismatch = ~agree & np.triu(np.ones(ref_codes.shape, dtype = bool))[np.newaxis]
+    df_conformance = pd.DataFrame({'log': np.arange(len(pairs_list)),
+                                   'fitness': agree.mean(axis = (1, 2)),
+                                   'mismatches': mismatch.sum(axis = (1, 2))})
+    n, i, j = np.nonzero(mismatch)
+    act_sorted = np.array(act_sorted, dtype = object)
+    symbols = np.array(footprint_symbols, dtype = object)
+    df_mismatches = pd.DataFrame({'log': n, 'pair': act_sorted[i] + act_sorted[j],
+                                  'rel_ref': symbols[ref_codes[i, j]], 'rel_log': symbols[codes[n, i, j]]})
+    return df_conformance, df_mismatches
+
+# =============================================================================
+# Export of the DFG matrix & footprint (without the dense |A|×|A| tables)
+# =============================================================================
+def get_sparse_matrix(in_pairs,in_qty_list,S,E):
+    '''
+    Computing the DFG matrix in the sparse (coordinate) format: only the arcs are stored.
+    Rows and columns are ordered as in get_footprint_matrix - [S,a,b,...,E].
+
+    Returns
+    -------
+    act_sorted : list
+        labels of rows and columns
+    rows, cols, qty : list
+        row index, column index and frequency of every arc
+    '''
+    act_nodes = list(set(list(''.join(in_pairs).replace(S,'').replace(E,'')))) # without S, E
+    act_sorted = [S]+sorted(act_nodes)+[E]
+    act_index = {a: i for i, a in enumerate(act_sorted)}
+    rows = [act_index[pair[0]] for pair in in_pairs]
+    cols = [act_index[pair[1]] for pair in in_pairs]
+    return act_sorted, rows, cols, list(in_qty_list)
+
+def get_footprint_relations(in_pairs):
+    '''
+    Computing the footprint in the long format: only the cells other than '#' are stored.
+    
+    Returns
+    -------
+    df_relations : pandas.DataFrame
+        2 columns: 'pair' - pairs of activities, 'rel' - relation ('→', '←' or '||')
+    '''
+    set_pairs = set(in_pairs)
+    relations = dict()
+    for pair in in_pairs:
+        pair_reverse = pair[::-1]
+        relations[pair] = '||' if pair_reverse in set_pairs else '→'
+        relations[pair_reverse] = '||' if pair_reverse in set_pairs else '←'
+    return pd.DataFrame({'pair': list(relations), 'rel': list(relations.values())})
+
+export_formats = {'parquet': '.parquet', 'arrow': '.arrow'}
+export_chunk_rows = 100000
+
+def save_table(path, df, fmt = 'parquet', chunk_rows = export_chunk_rows):
+    '''
+    Saving the table as a Parquet file or an Arrow IPC file (fmt = 'parquet' or 'arrow').
+    The table is converted to Arrow and written by chunks of chunk_rows rows
+    (one Parquet row group / Arrow record batch per chunk), path - file name or binary file object.
+    '''
+    if fmt not in export_formats: raise ValueError('Unknown format %s (expected %s)' % (fmt, ' or '.join(export_formats)))
+    schema = pa.Schema.from_pandas(df.head(chunk_rows), preserve_index = False)
+    writer = pq.ParquetWriter(path, schema) if fmt == 'parquet' else pa.ipc.new_file(path, schema)
+    with writer:
+        for start in range(0, max(len(df), 1), chunk_rows):
+            writer.write_table(pa.Table.from_pandas(df.iloc[start:start + chunk_rows], schema = schema, preserve_index = False))
+
+def save_matrix_npz(path, DFG_arcs, S, E):
+    '''
+    Saving the DFG matrix as a compressed sparse file (numpy .npz with arrays 'act', 'row', 'col', 'qty')
+    '''
+    act_sorted, rows, cols, qty = get_sparse_matrix(list(DFG_arcs['pair']), list(DFG_arcs['qty']), S, E)
+    np.savez_compressed(path, act = np.array(act_sorted), row = np.array(rows, dtype = np.int32),
+                        col = np.array(cols, dtype = np.int32), qty = np.array(qty, dtype = np.int64))
+
+def save_footprint_parquet(path, DFG_arcs, fmt = 'parquet'):
+    '''
+    Saving the DFG footprint in the long format (see get_footprint_relations) as a Parquet (Arrow) file
+    '''
+    save_table(path, get_footprint_relations(list(DFG_arcs['pair'])), fmt)
+
+def get_export_paths(out_dir, name, fmt = 'parquet'):
+    '''
+    Files of the DFG export of one log: {'nodes': ..., 'arcs': ..., 'matrix': ..., 'footprint': ...}
+    '''
+    ext = export_formats[fmt]
+    return {'nodes': os.path.join(out_dir, name + '_nodes' + ext), 'arcs': os.path.join(out_dir, name + '_arcs' + ext),
+            'matrix': os.path.join(out_dir, name + '_matrix.npz'), 'footprint': os.path.join(out_dir, name + '_footprint' + ext)}
+
+def save_DFG_export(paths, DFG_nodes, DFG_arcs, S, E, fmt = 'parquet'):
+    '''
+    Bulk export of the DFG (see get_export_paths): nodes & arcs tables and the footprint as Parquet (Arrow) files,
+    the DFG matrix as a compressed sparse file. The dense |A|×|A| tables are not built.
+    paths - dict of file names or binary file objects
+    '''
+    save_table(paths['nodes'], DFG_nodes, fmt)
+    save_table(paths['arcs'], DFG_arcs, fmt)
+    save_matrix_npz(paths['matrix'], DFG_arcs, S, E)
+    save_footprint_parquet(paths['footprint'], DFG_arcs, fmt)
+
 # =============================================================================
 # Special function to get texts in markdown format
 # =============================================================================
@@ -581,6 +1633,11 @@ def get_dict_text():
            [link](https://doi.org/10.1007/978-3-031-08848-3_2)
            ''')
     # common block
+    dict_text['cb_streaming_mode','en'] = ('''
+           The event log is large: the in-memory discovery would need about %.0f MB (memory budget %d MB).
+           The DFG is computed by the streaming discovery with bounded memory, 
+           the tables show only the first %d variants of the log.
+           ''')
     dict_text['cb_recall_dfg_def','en'] = ('''
            First, let us recall **the definition of a Directly-Follows Graph** [1].
            This definition will be helpful in all exercises.    
@@ -707,9 +1764,18 @@ def get_dict_text():
                 3. Obtained all arcs and their frequencies in F.
                 4. Visualized DFG using `graphviz`."                                   
                ''') 
+    dict_text['p1_export','en'] = ('''
+               Download the DFG for other tools: `nodes` and `arcs` - tables of the DFG, `matrix` - DFG matrix in the sparse
+               format (`numpy.load`: arrays `act`, `row`, `col`, `qty`), `footprint` - pairs of activities with their relation
+               (the `#` cells are not stored). Parquet and Arrow files can be read by `pandas`, `pyarrow` and other tools.
+               ''')
     # =============================================================================
     # page 2 - DFG matrix & footprint
     # =============================================================================
+    dict_text['p2_relation_note','en'] = ('''
+               The matrix and the footprint below are built for the **%s** relation instead of the directly-follows relation.
+               The step-by-step examples are given for the directly-follows relation.
+              ''')
     dict_text['p2_step_1_title','en'] = ('''
                **Step 1. Get the DFG matrix**                              
            ''')                                             